@@ -1,71 +1,130 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
 import os
 
-# Load the data
-file_name = "Comparison Query.txt"
-columns = ["year", "area", "land cover", "agricultural emissions"]
-data = pd.read_csv(file_name, names=columns, encoding='latin1')
+import matplotlib
+matplotlib.use('Agg')  # Charts are only ever written to files
 
-# Clean data by filling missing values if necessary
-data.fillna(0, inplace=True)
-
-# Debug: Print maximum values in the dataset for verification
-print("Maximum Land Cover:", data['land cover'].max())
-print("Maximum Agricultural Emissions:", data['agricultural emissions'].max())
-
-# Find global maximum values for fixed scaling
-max_land_cover = data['land cover'].max()  # Raw values for land cover
-max_emissions = data['agricultural emissions'].max()  # Raw values for emissions
+from aggregates import VALUE_COLUMNS, OrderedUnique, RunningMax, consume
+from batch_render import render_batch
+from build_manifest import BuildManifest
+from chart_output import add_output_arguments, collection_path, save_options, write_collection
+from countries import skipped_areas
+from data_loader import add_stream_arguments, load_data, partition_by_area, read_filtered, snapshot_checks, stream_data
+from instrumentation import add_instrumentation_arguments, configure_from_args, report, stage
+from render_engine import ComparisonChart
+from scales import format_tick, load_scales, log_ticks
 
 # Directory to save plots
 output_dir = "Country_Graphs_Updated"
-os.makedirs(output_dir, exist_ok=True)
 
-def save_country_comparison_plot(country):
-    # Filter data for the specified country
-    country_data = data[data['area'] == country]
-    
+# Global axis limits and savefig() options, set by set_axis_limits() in the
+# main process and in every render worker
+max_land_cover = None
+max_emissions = None
+chart_save_options = {}
+
+# Chart template reused for every country rendered by this process
+chart = None
+
+def set_axis_limits(land_cover_limit, emissions_limit, options=None):
+    global max_land_cover, max_emissions, chart_save_options, chart
+    max_land_cover = land_cover_limit
+    max_emissions = emissions_limit
+    chart_save_options = options or {}
+    if chart is not None:
+        chart.close()
+        chart = None
+
+def output_path_for(country):
+    return os.path.join(output_dir, f"{country}_comparison.png")
+
+def save_country_comparison_plot(country, country_data, output=None):
+    # country_data is the country's precomputed slice of the dataset; output
+    # is the chart's PNG file unless a collection page is given
     if country_data.empty:
-        print(f"No data found for {country}")
-        return
+        return None
 
-    # Create the plot
-    x_labels = country_data['year'].astype(int).astype(str)
-    bar_width = 0.4
-    
-    fig, ax1 = plt.subplots(figsize=(10, 6))
-
-    # Primary axis for land cover with logarithmic scale
-    ax1.bar(x_labels, country_data['land cover'], width=bar_width, label='Land Cover (1000 hectares)', color='blue', align='center')
-    ax1.set_xlabel('Year', fontsize=12)
-    ax1.set_ylabel('Land Cover (1000 hectares)', fontsize=12, color='blue')
-    ax1.tick_params(axis='y', labelcolor='blue')
-    ax1.set_yscale('log')  # Apply logarithmic scale for land cover
-    ax1.set_ylim(1, max_land_cover)  # Avoid 0 for logarithmic scale
-
-    # Secondary axis for emissions with logarithmic scale
-    ax2 = ax1.twinx()
-    ax2.bar(x_labels, country_data['agricultural emissions'], width=bar_width, label='Emissions (kilotons)', color='orange', align='edge')
-    ax2.set_ylabel('Emissions (kilotons)', fontsize=12, color='orange')
-    ax2.tick_params(axis='y', labelcolor='orange')
-    ax2.set_yscale('log')  # Apply logarithmic scale for emissions
-    ax2.set_ylim(1, max_emissions)  # Avoid 0 for logarithmic scale
-
-    # Add title and adjust x-axis ticks
-    plt.title(f'Comparison of Land Cover and Emissions in {country}', fontsize=14)
-    ax1.set_xticks(range(len(x_labels)))
-    ax1.set_xticklabels(x_labels, rotation=45, ha='right')
-    fig.tight_layout()
+    # The figure, log scales and limits are built once per process; only the
+    # bars, tick labels and title change between countries
+    global chart
+    if chart is None:
+        chart = ComparisonChart(max_land_cover, max_emissions, save_options=chart_save_options)
 
     # Save plot to file
-    output_path = os.path.join(output_dir, f"{country}_comparison.png")
-    plt.savefig(output_path)
-    plt.close()
-    print(f"Saved plot for {country} at {output_path}")
+    output_path = output_path_for(country) if output is None else output
+    chart.render(country, country_data['year'], country_data['land cover'],
+                 country_data['agricultural emissions'], output_path)
+    return output_path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a land cover vs emissions chart for every country.")
+    parser.add_argument('--workers', type=int, default=1, help="number of render processes (default: 1)")
+    parser.add_argument('--force', action='store_true', help="re-render charts whose inputs have not changed")
+    add_stream_arguments(parser)
+    add_output_arguments(parser)
+    add_instrumentation_arguments(parser)
+    parser.add_argument('--countries-per-pass', type=int, default=250,
+                        help="in --stream mode, countries whose rows are held in memory at once (default: 250)")
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+    options = save_options(args.format, args.dpi)
+
+    if args.stream:
+        # First pass: global maxima and the country list, keeping no rows
+        maxima = RunningMax(VALUE_COLUMNS)
+        areas = OrderedUnique('area')
+        with stage('scan_limits'):
+            consume(stream_data(chunksize=args.chunksize), maxima, areas)
+        limits = maxima.result()
+        set_axis_limits(limits['land cover'], limits['agricultural emissions'], options)
+
+        # Then one filtered pass per group of countries; aggregates get no chart
+        skipped = skipped_areas()
+        countries = [area for area in areas.result() if area not in skipped]
+        groups = [countries[i:i + args.countries_per_pass] for i in range(0, len(countries), args.countries_per_pass)]
+        partitions = (partition_by_area(read_filtered(chunksize=args.chunksize, areas=set(group))) for group in groups)
+    else:
+        # Load the data (served from the cached snapshot, cleaned and typed)
+        data = load_data()
+
+        # Global maximum values for fixed scaling, computed once per dataset
+        # version and kept with the snapshot
+        with stage('axis_limits'):
+            scales = load_scales(data=data)['columns']
+            set_axis_limits(scales['land cover']['max'], scales['agricultural emissions']['max'], options)
+
+        # Aggregates and areas the loader found to be sums of others get no chart
+        partitions = [partition_by_area(data[~data['area'].isin(skipped_areas(snapshot_checks()))])]
+
+    # Debug: Print maximum values in the dataset for verification
+    print("Maximum Land Cover:", max_land_cover)
+    print("Maximum Agricultural Emissions:", max_emissions)
+
+    if args.format != 'png':
+        # Every country as a page of one PDF or a symbol of one SVG, drawn by
+        # this process in a single pass
+        jobs = (job for partition in partitions for job in partition)
+        write_collection(collection_path(output_dir, args.format), args.format, jobs, save_country_comparison_plot)
+        report(args)
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Batch processing for all unique countries, partitioned in one pass;
+    # charts whose inputs and axis limits are unchanged are skipped
+    manifest = BuildManifest(output_dir)
+    params = {'max_land_cover': max_land_cover, 'max_emissions': max_emissions}
+    if chart_save_options:
+        params['save_options'] = chart_save_options
+    for partition in partitions:
+        jobs = manifest.stale_jobs(partition, [save_country_comparison_plot, ComparisonChart, log_ticks, format_tick],
+                                   output_path_for, params, force=args.force)
+        render_batch(save_country_comparison_plot, jobs, workers=args.workers,
+                     initializer=set_axis_limits, initargs=(max_land_cover, max_emissions, chart_save_options),
+                     verbose=not args.quiet)
+        manifest.save()
 
-# Batch processing for all unique countries
-countries = data['area'].unique()
-for country in countries:
-    save_country_comparison_plot(country)
+    report(args)
 
+if __name__ == '__main__':
+    main()
@@ -1,95 +1,55 @@
-import pandas as pd
-import json
-import plotly.graph_objects as go
-
-# Load the data
-file_name = "Comparison Query.txt"
-columns = ["year", "area", "land cover", "agricultural emissions"]
-data = pd.read_csv(file_name, names=columns, encoding='latin1')
-data.fillna(0, inplace=True)
-
-# Ensure the 'year' column is numeric for filtering
-data['year'] = pd.to_numeric(data['year'], errors='coerce')
-
-# Filter data for years from 1992 onwards
-data = data[data['year'] >= 1992]
-
-# Load continent data
-with open('country-by-continent.json', 'r') as f:
-    continent_data = json.load(f)
-
-# Create a dictionary for continent mapping
-continent_map = {entry['country']: entry['continent'] for entry in continent_data}
-
-# Map countries to continents based on substring matching
-def get_continent(area):
-    for country, continent in continent_map.items():
-        if country in area:
-            return continent
-    return "Unknown"
-
-data['continent'] = data['area'].apply(get_continent)
-
-# Identify and print unknown countries
-unknown_countries = data[data['continent'] == "Unknown"]['area'].unique()
-if len(unknown_countries) > 0:
-    print("Countries categorized as 'Unknown':")
-    for country in unknown_countries:
-        print(f"- {country}")
-else:
-    print("No unknown countries found.")
-
-# Define tick values and labels for the y-axis (log scale)
-tickvals = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000, 2000000, 5000000, 10000000, 20000000, 50000000, 100000000, 200000000, 500000000, 1000000000, 2000000000, 5000000000, 10000000000]
-ticktext = ['1', '2', '5', '10', '20', '50', '100', '200', '500', '1000', '2000', '5000', '10⁴', '2×10⁴', '5×10⁴', '10⁵', '2×10⁵', '5×10⁵', '10⁶', '2×10⁶', '5×10⁶', '10⁷', '2×10⁷', '5×10⁷', '10⁸', '2×10⁸', '5×10⁸', '10⁹', '2×10⁹', '5×10⁹', '10¹⁰']
-
-# Create the interactive plot
-fig = go.Figure()
-
-# Function to generate the plot for the selected year
-def update_graph(year):
-    filtered_data = data[data['year'] == year]
-    continent_averages = filtered_data.groupby('continent')[['land cover', 'agricultural emissions']].mean().reset_index()
-    
-    # Add bar for land cover
-    fig.add_trace(go.Bar(
-        x=continent_averages['continent'],
-        y=continent_averages['land cover'],
-        name='Average Land Cover (1000 hectares)',
-        text=continent_averages['land cover'],
-        textposition='auto',
-        marker_color='blue'
-    ))
-
-    # Add bar for agricultural emissions
-    fig.add_trace(go.Bar(
-        x=continent_averages['continent'],
-        y=continent_averages['agricultural emissions'],
-        name='Average Emissions (kilotons)',
-        text=continent_averages['agricultural emissions'],
-        textposition='auto',
-        marker_color='orange'
-    ))
-
-    fig.update_layout(
-        title=f'Average Land Cover and Emissions by Continent for {year}',
-        xaxis_title='Continent',
-        yaxis_title='Values (Logarithmic Scale)',
-        yaxis=dict(
-            type='log', 
-            tickvals=tickvals,
-            ticktext=ticktext
-        ),
-        barmode='group',
-        hovermode='x unified'
-    )
-
-# HTML structure with dropdown and JavaScript to handle the interaction
-html_code = f"""
+import argparse
+
+from aggregates import VALUE_COLUMNS, RunningGroupSum, consume_by_year, cube_from_sums
+from countries import map_continents, with_continents
+from data_loader import add_stream_arguments, load_data, stream_data
+from html_output import add_plotly_arguments, plotly_script_tag, to_js
+from instrumentation import add_instrumentation_arguments, configure_from_args, report, stage
+from scales import decade_range, log_ticks
+
+# Output page
+output_file = "interactive_graph_with_dropdown_1992_onwards.html"
+
+def load_cube(stream=False, chunksize=None):
+    # Pre-aggregate per-year continent averages so the page does no scanning
+    if stream:
+        # Accumulate sums and counts chunk by chunk; only the cube stays in memory
+        chunks = stream_data(chunksize=chunksize, min_year=1992)
+        totals = RunningGroupSum(['year', 'continent'], VALUE_COLUMNS)
+        consume_by_year(with_continents(chunks), totals)
+        return cube_from_sums(*totals.result(), stats=('count', 'mean'))
+
+    # Load the data (served from the cached snapshot, cleaned and typed)
+    data = load_data()
+
+    # Filter data for years from 1992 onwards
+    data = data[data['year'] >= 1992]
+
+    # Map countries to continents once per unique area (unresolved areas are
+    # reported the first time they are seen)
+    data['continent'] = map_continents(data['area'])
+
+    # Accumulated one year at a time, like the stream, so each year can be
+    # timed and profiled
+    totals = RunningGroupSum(['year', 'continent'], VALUE_COLUMNS)
+    consume_by_year([data], totals)
+    return cube_from_sums(*totals.result(), stats=('count', 'mean'))
+
+def axis_layout(cube):
+    # One log y axis for every year, in whole decades around all the
+    # averages, so switching years keeps the scale (see scales.py)
+    values = [value for column in VALUE_COLUMNS for row in cube['mean'][column] for value in row if value]
+    lower, upper = decade_range(min(values), max(values))
+    tickvals, ticktext = log_ticks(10.0 ** lower, 10.0 ** upper)
+    return {'type': 'log', 'range': [lower, upper], 'tickvals': tickvals, 'ticktext': ticktext}
+
+def build_html(cube, plotly_tag):
+    # HTML structure with dropdown and JavaScript to handle the interaction
+    return f"""
 <!DOCTYPE html>
 <html>
 <head>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    {plotly_tag}
     <style>
         body {{
             font-family: Arial, sans-serif;
@@ -106,41 +66,32 @@ html_code = f"""
     
     <!-- Dropdown for year selection -->
     <select id="year-dropdown" onchange="updateGraph()">
-        {"".join([f'<option value="{int(year)}">{int(year)}</option>' for year in sorted(data['year'].unique())])}
+        {"".join([f'<option value="{year}">{year}</option>' for year in cube['years']])}
     </select>
 
     <div id="plot"></div>
 
     <script>
-        var data = {data.to_json(orient='records')};
+        // Per-year continent averages, indexed [year][continent]
+        var cube = {to_js(cube)};
+        var yaxis = {to_js(axis_layout(cube))};
 
         function updateGraph() {{
             var selectedYear = parseInt(document.getElementById("year-dropdown").value);
-            var filteredData = data.filter(function(row) {{
-                return row.year == selectedYear;
-            }});
-
-            var continentAverages = aggregateDataByContinent(filteredData);
+            var continentAverages = continentAveragesForYear(cube.years.indexOf(selectedYear));
             updatePlot(continentAverages);
         }}
 
-        function aggregateDataByContinent(data) {{
+        function continentAveragesForYear(i) {{
             var continentAverages = {{}};
-            data.forEach(function(row) {{
-                var continent = row.continent;
-                if (!continentAverages[continent]) {{
-                    continentAverages[continent] = {{landCover: 0, emissions: 0, count: 0}};
+            cube.continents.forEach(function(continent, j) {{
+                if (cube.count[i][j] > 0) {{
+                    continentAverages[continent] = {{
+                        landCover: cube.mean['land cover'][i][j],
+                        emissions: cube.mean['agricultural emissions'][i][j]
+                    }};
                 }}
-                continentAverages[continent].landCover += row['land cover'];
-                continentAverages[continent].emissions += row['agricultural emissions'];
-                continentAverages[continent].count += 1;
             }});
-
-            // Calculate averages
-            for (var continent in continentAverages) {{
-                continentAverages[continent].landCover /= continentAverages[continent].count;
-                continentAverages[continent].emissions /= continentAverages[continent].count;
-            }}
             return continentAverages;
         }}
 
@@ -170,7 +121,7 @@ html_code = f"""
                 marker: {{ color: 'orange' }}
             }};
 
-            Plotly.newPlot('plot', [landCoverTrace, emissionsTrace]);
+            Plotly.newPlot('plot', [landCoverTrace, emissionsTrace], {{ yaxis: yaxis }});
         }}
 
         // Initialize the graph with the default year
@@ -180,9 +131,27 @@ html_code = f"""
 </html>
 """
 
-# Save the HTML file
-output_file = "interactive_graph_with_dropdown_1992_onwards.html"
-with open(output_file, "w", encoding="utf-8") as f:
-    f.write(html_code)
 
-print(f"Interactive graph saved as {output_file}.")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the continent averages page with a year dropdown.")
+    add_plotly_arguments(parser)
+    add_stream_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+
+    with stage('load_cube'):
+        cube = load_cube(args.stream, args.chunksize)
+
+    # Script tag for Plotly (CDN or a vendored, content-hashed local copy)
+    plotly_tag = plotly_script_tag(output_file, args.plotly, args.plotly_js)
+
+    # Save the HTML file
+    with stage('write_page'), open(output_file, "w", encoding="utf-8") as f:
+        f.write(build_html(cube, plotly_tag))
+
+    print(f"Interactive graph saved as {output_file}.")
+    report(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,76 +1,117 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
 import os
-import json
 
-# Load the data
-file_name = "Comparison Query.txt"
-columns = ["year", "area", "land cover", "agricultural emissions"]
-data = pd.read_csv(file_name, names=columns, encoding='latin1')
-
-# Load population data from JSON
-population_file = "country-by-population.json"
-with open(population_file, 'r') as f:
-    population_data = json.load(f)
-
-# Convert JSON data to DataFrame
-population_df = pd.DataFrame(population_data)  # Assumes keys: "country" and "population"
-population_df.rename(columns={'country': 'area'}, inplace=True)
-
-# Merge population data with emissions and land cover data
-data = pd.merge(data, population_df, on='area', how='left')
-
-# Filter data for the year 2021
-data['year'] = pd.to_numeric(data['year'], errors='coerce')
-data_2021 = data[data['year'] == 2021]
-
-# Clean data by filling missing values
-for col in ['land cover', 'agricultural emissions', 'population']:
-    data_2021[col] = data_2021[col].fillna(0)
-
-# Directory to save plots
+import matplotlib
+matplotlib.use('Agg')  # Charts are only ever written to files
+
+from batch_render import render_batch
+from build_manifest import BuildManifest
+from chart_output import add_output_arguments, collection_path, save_options, write_collection
+from countries import skipped_areas
+from data_loader import add_stream_arguments, partition_by_area, read_filtered, snapshot_checks
+from enrichment import enrich, load_enriched
+from instrumentation import add_instrumentation_arguments, configure_from_args, report, stage
+from render_engine import HorizontalBarChart
+
+# Year charted, its output directory and savefig() options, set by
+# set_year() in the main process and in every render worker
+year = 2021
 output_dir = "Country_Horizontal_Bar_Graphs_2021"
-os.makedirs(output_dir, exist_ok=True)
-
-def save_country_horizontal_bar_plot(country):
-    # Filter data for the specified country
-    country_data = data_2021[data_2021['area'] == country]
-
+chart_save_options = {}
+
+# Chart template reused for every country rendered by this process
+chart = None
+
+def set_year(chart_year, options=None):
+    global year, output_dir, chart_save_options, chart
+    year = chart_year
+    output_dir = f"Country_Horizontal_Bar_Graphs_{chart_year}"
+    chart_save_options = options or {}
+    if chart is not None:
+        chart.close()
+        chart = None
+
+def load_plot_data(stream=False, chunksize=None):
+    if stream:
+        # Only the selected year's rows are kept while reading the source in
+        # chunks, then joined to the reference files
+        data = enrich(read_filtered(chunksize=chunksize, year=year))
+        skipped = skipped_areas()
+    else:
+        # The enriched table (continent, population and per-capita columns
+        # for every year) is served from its cached snapshot
+        data = load_enriched()
+        skipped = skipped_areas(snapshot_checks())
+
+    # Filter data for the selected year; aggregates get no chart
+    with stage('filter_year'):
+        data_year = data[(data['year'] == year) & ~data['area'].isin(skipped)]
+
+    # Clean data by filling missing values (areas without a population
+    # figure are drawn with a zero bar)
+    return data_year.fillna({'land cover': 0, 'agricultural emissions': 0, 'population': 0})
+
+def output_path_for(country):
+    return os.path.join(output_dir, f"{country}_comparison_{year}.png")
+
+def save_country_horizontal_bar_plot(country, country_data, output=None):
+    # country_data is the country's precomputed slice of the year's rows;
+    # output is the chart's PNG file unless a collection page is given
     if country_data.empty:
-        print(f"No data found for {country}")
-        return
+        return None
 
     # Extract values for the plot
     land_cover = country_data['land cover'].values[0]
     emissions = country_data['agricultural emissions'].values[0]
     population = country_data['population'].values[0]
 
-    # Data and labels
-    values = [land_cover, emissions, population]
-    labels = ['Land Cover (1000 hectares)', 'Agricultural Emissions (kilotons)', 'Population']
-    colors = ['blue', 'orange', 'green']
-
-    # Create the plot
-    fig, ax = plt.subplots(figsize=(10, 6))
-    bars = ax.barh(labels, values, color=colors)
-
-    # Add value labels to bars
-    for bar in bars:
-        width = bar.get_width()
-        ax.text(width, bar.get_y() + bar.get_height() / 2, f'{width:,.2f}', va='center', ha='left', fontsize=10)
-
-    # Set axis labels and title
-    ax.set_xlabel('Values', fontsize=12)
-    ax.set_title(f'Comparison of Land Cover, Emissions, and Population in {country} (2021)', fontsize=14)
-    plt.tight_layout()
+    # The figure, labels and colours are built once per process; only the
+    # bar widths, value labels and title change between countries
+    global chart
+    if chart is None:
+        chart = HorizontalBarChart(year, save_options=chart_save_options)
 
     # Save plot to file
-    output_path = os.path.join(output_dir, f"{country}_comparison_2021.png")
-    plt.savefig(output_path)
-    plt.close()
-    print(f"Saved plot for {country} at {output_path}")
-
-# Batch processing for all unique countries
-countries = data_2021['area'].unique()
-for country in countries:
-    save_country_horizontal_bar_plot(country)
+    output_path = output_path_for(country) if output is None else output
+    chart.render(country, [land_cover, emissions, population], output_path)
+    return output_path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a land cover, emissions and population chart for every country.")
+    parser.add_argument('--year', type=int, default=2021, help="year to chart (default: 2021)")
+    parser.add_argument('--workers', type=int, default=1, help="number of render processes (default: 1)")
+    parser.add_argument('--force', action='store_true', help="re-render charts whose inputs have not changed")
+    add_stream_arguments(parser)
+    add_output_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+
+    set_year(args.year, save_options(args.format, args.dpi))
+    data_year = load_plot_data(args.stream, args.chunksize)
+
+    if args.format != 'png':
+        # Every country as a page of one PDF or a symbol of one SVG, drawn by
+        # this process in a single pass
+        write_collection(collection_path(output_dir, args.format), args.format,
+                         partition_by_area(data_year), save_country_horizontal_bar_plot)
+        report(args)
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Batch processing for all unique countries, partitioned in one pass;
+    # charts whose row for the year (including population) is unchanged are skipped
+    manifest = BuildManifest(output_dir)
+    params = {'year': year}
+    if chart_save_options:
+        params['save_options'] = chart_save_options
+    jobs = manifest.stale_jobs(partition_by_area(data_year), [save_country_horizontal_bar_plot, HorizontalBarChart], output_path_for,
+                               params, force=args.force)
+    render_batch(save_country_horizontal_bar_plot, jobs, workers=args.workers,
+                 initializer=set_year, initargs=(year, chart_save_options), verbose=not args.quiet)
+    manifest.save()
+    report(args)
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,97 @@
-import pandas as pd
+import argparse
+import os
 
-# Load and preprocess the data
-file_name = "Comparison Query.txt"
-columns = ["year", "area", "land cover", "agricultural emissions"]
-data = pd.read_csv(file_name, names=columns, encoding='latin1')
-data.fillna(0, inplace=True)
+from aggregates import LOD_WIDTHS, VALUE_COLUMNS, dashboard_payload, lod_tiers, series_by_area
+from data_loader import load_data
+from html_output import (DECODER_SCRIPT, add_encoding_arguments, add_plotly_arguments, payload_script,
+                         plotly_script_tag, to_js, write_shards)
+from scales import load_scales, log_axis
 
-# Generate HTML content
-dropdown_options = [{"label": country, "value": country} for country in data['area'].unique()]
+# Output page; sharded mode writes the per-country files next to it
+output_file = "final_v2_logarithmic.html"
+shard_dir = "final_v2_logarithmic_data"
+
+# Number of country shards the page keeps in memory
+shard_cache_size = 32
+
+# Most bars per trace drawn before the page switches to a coarser tier;
+# countries with no more yearly rows than this carry no tiers
+lod_max_bars = 40
+
+def inline_data_script(series, compression):
+    # Every country's arrays embedded in the page
+    return (DECODER_SCRIPT if compression != 'none' else '') + f"""
+        // {{country: {{year: [...], 'land cover': [...], 'agricultural emissions': [...],
+        //             tiers: {{...}} (long series only)}}}}
+        const seriesReady = {payload_script(series, [], 'json', compression, output_file)};
+
+        async function getCountryData(country) {{
+            return (await seriesReady)[country];
+        }}
+"""
+
+def encoded_data_script(payload, encoding, compression):
+    # Every country's rows embedded as typed-array columns (see
+    # aggregates.dashboard_payload), sliced into plain arrays per country;
+    # payload.tiers stays JSON
+    return DECODER_SCRIPT + f"""
+        const payloadReady = {payload_script(payload, ['year'] + VALUE_COLUMNS, encoding, compression, output_file)};
+        const areaIndexReady = payloadReady.then(
+            payload => new Map(Array.from(payload.area, (name, i) => [payload.strings[name], i])));
+
+        async function getCountryData(country) {{
+            const payload = await payloadReady;
+            const i = (await areaIndexReady).get(country);
+            if (i === undefined) {{
+                return undefined;
+            }}
+            const start = payload.offsets[i];
+            const end = payload.offsets[i + 1];
+            return {{
+                year: Array.from(payload.year.slice(start, end)),
+                'land cover': Array.from(payload['land cover'].slice(start, end)),
+                'agricultural emissions': Array.from(payload['agricultural emissions'].slice(start, end)),
+                tiers: payload.tiers[country]
+            }};
+        }}
+"""
+
+def sharded_data_script(shard_index):
+    # Only the country -> shard file index is embedded; shards are fetched
+    # on first selection and kept in a small LRU cache. fetch() needs the
+    # page to be served over HTTP rather than opened from disk.
+    return f"""
+        const shardIndex = {to_js(shard_index)};
+        const shardCacheSize = {shard_cache_size};
+        const shardCache = new Map();
 
-html_code = f"""
+        async function getCountryData(country) {{
+            if (shardCache.has(country)) {{
+                // Re-insert to mark the shard as most recently used
+                const cached = shardCache.get(country);
+                shardCache.delete(country);
+                shardCache.set(country, cached);
+                return cached;
+            }}
+            if (!(country in shardIndex)) {{
+                return undefined;
+            }}
+            const response = await fetch(shardIndex[country]);
+            const countryData = await response.json();
+            shardCache.set(country, countryData);
+            if (shardCache.size > shardCacheSize) {{
+                shardCache.delete(shardCache.keys().next().value);
+            }}
+            return countryData;
+        }}
+"""
+
+# Page template; the {placeholders} are filled in by build_html()
+html_template = """
 <!DOCTYPE html>
 <html>
 <head>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    {plotly_tag}
     <style>
         body {{
             font-family: Arial, sans-serif;
@@ -30,46 +108,63 @@ html_code = f"""
     <h1>Country Statistics: Land Cover and Agricultural Emissions</h1>
     <select id="dropdown" onchange="updateGraph()">
         <option value="">Select a country</option>
-        {''.join([f'<option value="{option["value"]}">{option["label"]}</option>' for option in dropdown_options])}
+        {options}
     </select>
     <div id="plot"></div>
     <script>
-        const data = {data.to_json(orient='records')};
+{data_script}
+        // Level of detail: besides the yearly values, long series carry
+        // mean/min/max aggregates over lodWidths-year buckets. The plot shows
+        // the finest tier with at most lodMaxBars bars per trace across the
+        // visible years (or the coarsest), switching tier as the x axis is
+        // zoomed.
+        const lodWidths = {lod_widths};
+        const lodMaxBars = {lod_max_bars};
+        let current = null;
 
-        function updateGraph() {{
-            const selectedCountry = document.getElementById("dropdown").value;
-            const countryData = data.filter(row => row.area === selectedCountry);
+        // Shared log-axis ticks, and each country's y range in whole decades
+        // (kept when the tier changes)
+        const axis = {axis};
 
-            if (countryData.length === 0) {{
-                document.getElementById("plot").innerHTML = "<p>Please select a valid country.</p>";
-                return;
+        // Format values in "k" or "M" notation for hover labels
+        const formatValue = v => {{
+            if (v >= 1e6) {{
+                return (v / 1e6).toFixed(2) + 'M'; // Millions
+            }} else if (v >= 1e3) {{
+                return (v / 1e3).toFixed(2) + 'k'; // Thousands
+            }} else {{
+                return v.toFixed(2); // Plain value
             }}
+        }};
+        const formatValues = values => values.map(formatValue);
 
-            // Extract data
-            const years = countryData.map(row => row.year);
-            const landCover = countryData.map(row => row['land cover']);
-            const emissions = countryData.map(row => row['agricultural emissions']);
-
-            // Format values in "k" or "M" notation for hover labels
-            const formatValues = values => values.map(v => {{
-                if (v >= 1e6) {{
-                    return (v / 1e6).toFixed(2) + 'M'; // Millions
-                }} else if (v >= 1e3) {{
-                    return (v / 1e3).toFixed(2) + 'k'; // Thousands
-                }} else {{
-                    return v.toFixed(2); // Plain value
+        function tierForRange(countryData, range) {{
+            // Bucket width in years (1 for the yearly values); only series
+            // longer than lodMaxBars carry coarser tiers
+            const years = countryData.year;
+            const visible = range ? years.filter(year => year >= range[0] && year <= range[1]).length : years.length;
+            const widths = lodWidths.filter(width => countryData.tiers && countryData.tiers[width]);
+            let tier = 1;
+            for (const width of widths) {{
+                if (visible / tier <= lodMaxBars) {{
+                    break;
                 }}
-            }});
+                tier = width;
+            }}
+            return tier;
+        }}
 
-            // Format data for display
-            const formattedLandCover = formatValues(landCover);
-            const formattedEmissions = formatValues(emissions);
+        function yearlyTraces(countryData) {{
+            // Extract data
+            const years = countryData.year;
+            const landCover = countryData['land cover'];
+            const emissions = countryData['agricultural emissions'];
 
             // Define traces
             const landCoverTrace = {{
                 x: years,
                 y: landCover,
-                text: formattedLandCover,
+                text: formatValues(landCover),
                 type: 'bar',
                 name: 'Land Cover (1000 hectares)',
                 marker: {{ color: 'blue' }},
@@ -79,44 +174,158 @@ html_code = f"""
             const emissionsTrace = {{
                 x: years,
                 y: emissions,
-                text: formattedEmissions,
+                text: formatValues(emissions),
                 type: 'bar',
                 name: 'Agricultural Emissions (kilotons)',
                 marker: {{ color: 'orange' }},
                 hovertemplate: 'Emissions: %{{text}}<br>Year: %{{x}}<extra></extra>'
             }};
+            return [landCoverTrace, emissionsTrace];
+        }}
+
+        function tierTraces(tier) {{
+            // One bar per bucket at its mean, centred on the bucket's years,
+            // with the bucket's min/max as whiskers
+            const x = tier.year.map((first, i) => (first + tier.end[i]) / 2);
+            const years = tier.year.map((first, i) => first === tier.end[i] ? `${{first}}` : `${{first}}-${{tier.end[i]}}`);
+            const trace = (column, name, label, color) => {{
+                const means = tier[column];
+                const minima = tier[column + ' min'];
+                const maxima = tier[column + ' max'];
+                return {{
+                    x: x,
+                    y: means,
+                    text: means.map((mean, i) => `${{formatValue(mean)}} (${{formatValue(minima[i])}} to ${{formatValue(maxima[i])}})`),
+                    customdata: years,
+                    type: 'bar',
+                    name: name,
+                    marker: {{ color: color }},
+                    error_y: {{
+                        type: 'data',
+                        symmetric: false,
+                        array: means.map((mean, i) => maxima[i] - mean),
+                        arrayminus: means.map((mean, i) => mean - minima[i]),
+                        color: 'gray'
+                    }},
+                    hovertemplate: `${{label}}: %{{text}}<br>Years: %{{customdata}}<extra></extra>`
+                }};
+            }};
+            return [
+                trace('land cover', 'Land Cover (1000 hectares)', 'Land Cover', 'blue'),
+                trace('agricultural emissions', 'Agricultural Emissions (kilotons)', 'Emissions', 'orange')
+            ];
+        }}
 
-            // Define layout with logarithmic y-axis
-            const layout = {{
-                title: `Statistics for ${{selectedCountry}}`,
+        function countryLayout(width, range) {{
+            // Layout with logarithmic y-axis
+            return {{
+                title: width === 1 ? `Statistics for ${{current.country}}`
+                                   : `Statistics for ${{current.country}} (${{width}}-year means)`,
                 xaxis: {{
                     title: 'Year',
                     tickangle: 45,
-                    dtick: 1
+                    dtick: width,
+                    range: range || undefined
                 }},
                 yaxis: {{
                     title: 'Values (Logarithmic Scale)',
                     type: 'log',
-                    tickvals: [1, 10, 100, 1000, 10000, 100000, 1000000, 10000000],
-                    ticktext: ['1', '10', '100', '1k', '10k', '100k', '1M', '10M']
+                    tickvals: axis.tickvals,
+                    ticktext: axis.ticktext,
+                    range: axis.ranges[current.country]
                 }},
                 barmode: 'group',
                 margin: {{
                     b: 100
                 }}
             }};
+        }}
+
+        function countryTraces(width) {{
+            return width === 1 ? yearlyTraces(current.data) : tierTraces(current.data.tiers[width]);
+        }}
 
-            // Render the plot
-            Plotly.newPlot('plot', [landCoverTrace, emissionsTrace], layout);
+        function onRelayout(event) {{
+            // Redraw at another tier only when the zoom crosses a threshold
+            let range = null;
+            if ('xaxis.range[0]' in event) {{
+                range = [event['xaxis.range[0]'], event['xaxis.range[1]']];
+            }} else if ('xaxis.range' in event) {{
+                range = event['xaxis.range'];
+            }} else if (!event['xaxis.autorange']) {{
+                return;
+            }}
+            const width = tierForRange(current.data, range);
+            if (width !== current.width) {{
+                current.width = width;
+                Plotly.react('plot', countryTraces(width), countryLayout(width, range));
+            }}
+        }}
+
+        async function updateGraph() {{
+            const selectedCountry = document.getElementById("dropdown").value;
+            const countryData = await getCountryData(selectedCountry);
+
+            // Another country may have been picked while a shard was loading
+            if (document.getElementById("dropdown").value !== selectedCountry) {{
+                return;
+            }}
+            if (!countryData) {{
+                document.getElementById("plot").innerHTML = "<p>Please select a valid country.</p>";
+                return;
+            }}
+
+            // Render the plot at the tier fitting the whole series
+            const width = tierForRange(countryData, null);
+            current = {{ country: selectedCountry, data: countryData, width: width }};
+            await Plotly.newPlot('plot', countryTraces(width), countryLayout(width, null));
+            document.getElementById("plot").on('plotly_relayout', onRelayout);
         }}
     </script>
 </body>
 </html>
 """
 
-# Save the HTML file
-output_file = "final_v2_logarithmic.html"
-with open(output_file, "w", encoding="utf-8") as f:
-    f.write(html_code)
+def build_html(countries, data_script, plotly_tag, axis):
+    options = ''.join([f'<option value="{country}">{country}</option>' for country in countries])
+    return html_template.format(options=options, data_script=data_script, plotly_tag=plotly_tag,
+                                lod_widths=to_js(LOD_WIDTHS), lod_max_bars=lod_max_bars, axis=to_js(axis))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the per-country land cover and emissions explorer page.")
+    parser.add_argument('--sharded', action='store_true',
+                        help=f"write one JSON file per country to {shard_dir}/ and load them on demand")
+    add_plotly_arguments(parser)
+    add_encoding_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.sharded and (args.encoding != 'json' or args.compress != 'none'):
+        parser.error("--encoding and --compress apply to the inline page; shards are always plain JSON")
+
+    # Load the data (served from the cached snapshot, cleaned and typed)
+    data = load_data()
+
+    # Group the rows by country once: each country holds parallel year/value
+    # arrays and its level-of-detail tiers
+    series = series_by_area(data)
+    tiers = lod_tiers(data[data.groupby('area')['year'].transform('size') > lod_max_bars])
+    for country, country_tiers in tiers.items():
+        series[country]['tiers'] = country_tiers
+
+    if args.sharded:
+        data_script = sharded_data_script(write_shards(shard_dir, series))
+    elif args.encoding != 'json':
+        payload = dashboard_payload(data)
+        payload['tiers'] = tiers
+        data_script = encoded_data_script(payload, args.encoding, args.compress)
+    else:
+        data_script = inline_data_script(series, args.compress)
+
+    # Save the HTML file
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(build_html(list(series), data_script, plotly_script_tag(output_file, args.plotly, args.plotly_js),
+                           log_axis(load_scales(data=data))))
+
+    print(f"HTML file saved as {output_file} ({os.path.getsize(output_file) / 1024:.1f} KB).")
 
-print(f"HTML file saved as {output_file}.")
+if __name__ == '__main__':
+    main()
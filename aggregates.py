@@ -0,0 +1,315 @@
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+VALUE_COLUMNS = ["land cover", "agricultural emissions"]
+
+# Bucket widths, in years, of the coarser level-of-detail tiers drawn by the
+# country explorer (the finest tier is the yearly series itself)
+LOD_WIDTHS = [5, 10]
+
+# A value is an outlier when it is more than this many decades (factors of
+# 10) away from the median of its area's positive values...
+OUTLIER_DECADES = 1.0
+# ...and the area has at least this many positive values to take it from
+OUTLIER_MIN_VALUES = 5
+
+# Median relative difference (per column, over the shared years) under
+# which an area counts as the sum of its parts; FAOSTAT revises the parts
+# and the aggregate separately, so single years may be further apart
+PARTS_TOLERANCE = 0.01
+
+
+class RunningMax:
+    # Column maxima accumulated over a stream of chunks
+    def __init__(self, columns):
+        self.maxima = dict.fromkeys(columns)
+
+    def update(self, chunk):
+        for column, current in self.maxima.items():
+            value = chunk[column].max()
+            self.maxima[column] = value if current is None else max(current, value)
+
+    def result(self):
+        return dict(self.maxima)
+
+
+class RunningGroupSum:
+    # Per-group sums and row counts accumulated over a stream of chunks; the
+    # partial results are tiny, so memory is bounded by the number of groups
+    def __init__(self, keys, columns):
+        self.keys = list(keys)
+        self.columns = list(columns)
+        self.sums = None
+        self.counts = None
+
+    def update(self, chunk):
+        grouped = chunk.groupby(self.keys)
+        sums = grouped[self.columns].sum()
+        counts = grouped.size()
+        if self.sums is None:
+            self.sums, self.counts = sums, counts
+        else:
+            self.sums = self.sums.add(sums, fill_value=0)
+            self.counts = self.counts.add(counts, fill_value=0).astype(np.int64)
+
+    def result(self):
+        # (sums, counts) indexed by the group keys
+        return self.sums, self.counts
+
+    def means(self):
+        return self.sums.div(self.counts, axis=0)
+
+
+class OrderedUnique:
+    # Distinct values of a column in order of first appearance
+    def __init__(self, column):
+        self.column = column
+        self.values = {}
+
+    def update(self, chunk):
+        self.values.update(dict.fromkeys(chunk[self.column].unique()))
+
+    def result(self):
+        return list(self.values)
+
+
+class RowChecks:
+    # Problems in raw (not yet cleaned) source rows, accumulated over one or
+    # more chunks: unparseable years, missing and negative values, and
+    # (year, area) keys that occur more than once. Rows are reported as
+    # [year, area] (unparseable years as [row number, raw value]), so the
+    # result is JSON-ready.
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.rows = 0
+        self.invalid_years = []
+        self.missing = {column: [] for column in self.columns}
+        self.negative = {column: [] for column in self.columns}
+        self.keys = []
+
+    def update(self, chunk):
+        years = pd.to_numeric(chunk['year'], errors='coerce')
+        invalid = years.isna().to_numpy()
+        for row in np.flatnonzero(invalid):
+            self.invalid_years.append([self.rows + int(row), str(chunk['year'].iloc[row])])
+        self.rows += len(chunk)
+
+        valid = chunk[~invalid]
+        years = years[~invalid].astype(np.int64)
+        for column in self.columns:
+            values = pd.to_numeric(valid[column], errors='coerce')
+            missing = values.isna()
+            self.missing[column] += [[int(year), str(area)] for year, area
+                                     in zip(years[missing], valid['area'][missing])]
+            negative = values < 0
+            self.negative[column] += [[int(year), str(area), float(value)] for year, area, value
+                                      in zip(years[negative], valid['area'][negative], values[negative])]
+        # Keys are counted once at the end, so repeats across chunks are found
+        self.keys.append(pd.DataFrame({'year': years.to_numpy(), 'area': valid['area'].astype(str).to_numpy()}))
+
+    def result(self):
+        # {"rows", "invalid_years", "missing": {column: [...]},
+        #  "negative": {column: [...]}, "duplicates": [[year, area, count], ...]}
+        duplicates = []
+        if self.keys:
+            counts = pd.concat(self.keys, ignore_index=True).value_counts(sort=False)
+            counts = counts[counts > 1].sort_index()
+            duplicates = [[int(year), area, int(count)] for (year, area), count in counts.items()]
+        return {'rows': self.rows, 'invalid_years': self.invalid_years, 'missing': self.missing,
+                'negative': self.negative, 'duplicates': duplicates}
+
+
+class AreaChecks:
+    # Problems in cleaned rows that need all of an area's rows at once:
+    # areas named after others that may be their sum ("China" = "China,
+    # mainland" + ...) and values far from their area's usual level. The
+    # chunks' year, area and value columns are kept until result().
+    def __init__(self, columns, decades=OUTLIER_DECADES, min_values=OUTLIER_MIN_VALUES):
+        self.columns = list(columns)
+        self.decades = decades
+        self.min_values = min_values
+        self.chunks = []
+
+    def update(self, chunk):
+        self.chunks.append(chunk[['year', 'area'] + self.columns])
+
+    def result(self):
+        # {"sums_of_parts": [{"area", "parts", "matches_parts"}, ...],
+        #  "outliers": [{"year", "area", "column", "value", "area_median"}, ...]}
+        if not self.chunks:
+            return {'sums_of_parts': [], 'outliers': []}
+        data = pd.concat(self.chunks, ignore_index=True)
+        return {
+            'sums_of_parts': [{'area': area, 'parts': parts,
+                               'matches_parts': matches_parts(data, area, parts, self.columns)}
+                              for area, parts in aggregate_parts(data['area'].unique()).items()],
+            'outliers': find_outliers(data, self.columns, self.decades, self.min_values),
+        }
+
+
+def aggregate_parts(areas):
+    # {area: [parts]} for areas that other areas are named after, FAOSTAT's
+    # "<area>, <part>" convention (e.g. "China, Hong Kong SAR")
+    names = set(areas)
+    parts = {}
+    for area in sorted(names):
+        members = sorted(name for name in names if name.startswith(area + ', '))
+        if members:
+            parts[area] = members
+    return parts
+
+
+def matches_parts(data, area, parts, columns=VALUE_COLUMNS, tolerance=PARTS_TOLERANCE):
+    # Whether area's yearly values are the sums of its parts' values
+    whole = data[data['area'] == area].groupby('year')[columns].sum()
+    summed = data[data['area'].isin(parts)].groupby('year')[columns].sum()
+    years = whole.index.intersection(summed.index)
+    if years.empty:
+        return False
+    whole, summed = whole.loc[years], summed.loc[years]
+    difference = (whole - summed).abs() / whole.abs().clip(lower=1)
+    return bool((difference.median() <= tolerance).all())
+
+
+def find_outliers(data, columns=VALUE_COLUMNS, decades=OUTLIER_DECADES, min_values=OUTLIER_MIN_VALUES):
+    # Rows whose value is more than `decades` orders of magnitude from the
+    # median of the area's positive values, in one grouped pass per column
+    outliers = []
+    for column in columns:
+        logs = np.log10(data[column].where(data[column] > 0))
+        grouped = logs.groupby(data['area'], sort=False)
+        median = grouped.transform('median')
+        flagged = ((logs - median).abs() > decades) & (grouped.transform('count') >= min_values)
+        for year, area, value, centre in zip(data['year'][flagged], data['area'][flagged],
+                                             data[column][flagged], median[flagged]):
+            outliers.append({'year': int(year), 'area': str(area), 'column': column,
+                             'value': float(value), 'area_median': round(float(10 ** centre), 2)})
+    return sorted(outliers, key=lambda row: (row['area'], row['column'], row['year']))
+
+
+def consume(chunks, *accumulators):
+    # Feed every chunk of a stream to each accumulator
+    for chunk in chunks:
+        for accumulator in accumulators:
+            accumulator.update(chunk)
+
+
+def consume_by_year(chunks, *accumulators):
+    # consume(), but while instrumentation is on one year of each chunk at a
+    # time, so the work for a year is timed and can be profiled (--profile
+    # YEAR) on its own. Group sums come out the same either way.
+    if not instrumentation.active():
+        consume(chunks, *accumulators)
+        return
+    for chunk in chunks:
+        for year, rows in chunk.groupby('year', sort=False):
+            with instrumentation.profiled(year), instrumentation.stage('aggregate_year', year):
+                for accumulator in accumulators:
+                    accumulator.update(rows)
+
+
+def continent_cube(data, columns=VALUE_COLUMNS, stats=('sum', 'count', 'mean')):
+    # Per-year, per-continent statistics as a compact, JSON-ready cube:
+    #   {"years": [...], "continents": [...], "count": [[...]],
+    #    "sum": {column: [[...]]}, "mean": {column: [[...]]}}
+    # Every matrix is indexed [year][continent]; a continent with no rows in
+    # a year has count 0 and null sum/mean.
+    grouped = data.groupby(['year', 'continent'])
+    return cube_from_sums(grouped[list(columns)].sum(), grouped.size(), columns, stats)
+
+
+def cube_from_sums(sums, counts, columns=VALUE_COLUMNS, stats=('sum', 'count', 'mean')):
+    # Build the cube from (year, continent)-indexed sums and counts, e.g. the
+    # result of a RunningGroupSum over a streamed source
+    years = sorted(sums.index.get_level_values('year').unique())
+    continents = sorted(sums.index.get_level_values('continent').unique())
+    index = pd.MultiIndex.from_tuples([(year, continent) for year in years for continent in continents])
+    sums = sums.reindex(index)
+    counts = counts.reindex(index, fill_value=0)
+
+    shape = (len(years), len(continents))
+    count_matrix = counts.to_numpy().reshape(shape)
+    cube = {
+        'years': [int(year) for year in years],
+        'continents': [str(continent) for continent in continents],
+    }
+    if 'count' in stats:
+        cube['count'] = count_matrix.tolist()
+    for stat in ('sum', 'mean'):
+        if stat not in stats:
+            continue
+        cube[stat] = {}
+        for column in columns:
+            values = sums[column].to_numpy().reshape(shape)
+            if stat == 'mean':
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values = values / count_matrix
+            values = np.where(count_matrix > 0, values, np.nan)
+            cube[stat][column] = [[None if np.isnan(v) else float(v) for v in row] for row in values]
+    return cube
+
+
+def series_by_area(data, columns=VALUE_COLUMNS):
+    # Country-keyed columnar layout: {area: {"year": [...], column: [...]}},
+    # one parallel array per column, in order of first appearance
+    series = {}
+    for area, area_data in data.groupby('area', sort=False):
+        entry = {'year': area_data['year'].astype(int).tolist()}
+        for column in columns:
+            entry[column] = area_data[column].astype(float).tolist()
+        series[str(area)] = entry
+    return series
+
+
+def lod_tiers(data, widths=LOD_WIDTHS, columns=VALUE_COLUMNS):
+    # Per-area aggregates over year buckets aligned to multiples of each
+    # width, for drawing long series with a bounded number of bars:
+    #   {area: {width: {"year": [...], "end": [...], column: [...],
+    #                   column + " min": [...], column + " max": [...]}}}
+    # "year" and "end" are the first and last years present in each bucket;
+    # each column holds the bucket means (to the source's two decimals), with
+    # their min/max envelope
+    tiers = {}
+    if data.empty:
+        return tiers
+    for width in widths:
+        bucket = (data['year'] // width * width).rename('bucket')
+        stats = data.groupby([data['area'], bucket]).agg({'year': ['min', 'max'], **{column: ['mean', 'min', 'max'] for column in columns}})
+
+        # Whole columns converted once, then sliced per area (rows are sorted by area)
+        fields = {'year': stats[('year', 'min')].astype(int).tolist(), 'end': stats[('year', 'max')].astype(int).tolist()}
+        for column in columns:
+            fields[column] = stats[(column, 'mean')].astype(float).round(2).tolist()
+            fields[column + ' min'] = stats[(column, 'min')].astype(float).tolist()
+            fields[column + ' max'] = stats[(column, 'max')].astype(float).tolist()
+        areas = stats.index.get_level_values('area')
+        starts = np.flatnonzero(areas[1:] != areas[:-1]) + 1
+        for start, end in zip([0, *starts], [*starts, len(stats)]):
+            tiers.setdefault(str(areas[start]), {})[str(width)] = {name: values[start:end] for name, values in fields.items()}
+    return tiers
+
+
+def dashboard_payload(data, columns=VALUE_COLUMNS):
+    # One deduplicated, columnar payload for every chart on the dashboard:
+    #   {"strings": [...], "area": [...], "offsets": [...], "year": [...],
+    #    column: [...]}
+    # Names appear once in the string table; "area" holds per-area indexes
+    # into it. Rows are grouped by area, so area i owns rows offsets[i] to
+    # offsets[i + 1] of the "year" and value arrays.
+    strings = {}
+
+    def intern(name):
+        return strings.setdefault(str(name), len(strings))
+
+    payload = {'strings': [], 'area': [], 'offsets': [0], 'year': []}
+    payload.update((column, []) for column in columns)
+    for area, area_data in data.groupby('area', sort=False):
+        payload['area'].append(intern(area))
+        payload['year'] += area_data['year'].astype(int).tolist()
+        for column in columns:
+            payload[column] += area_data[column].astype(float).tolist()
+        payload['offsets'].append(len(payload['year']))
+    payload['strings'] += strings
+    return payload
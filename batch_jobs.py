@@ -0,0 +1,195 @@
+import argparse
+import json
+import os
+
+import matplotlib
+matplotlib.use('Agg')  # Charts are only ever written to files
+
+from batch_render import render_batch
+from build_manifest import BuildManifest
+from countries import skipped_areas
+from data_loader import partition_by_area, snapshot_checks
+from enrichment import CUMULATIVE_EMISSIONS, PER_CAPITA, PER_HECTARE, load_enriched, rolling_column
+from instrumentation import add_instrumentation_arguments, configure_from_args, report, stage
+from render_engine import ComparisonChart, HorizontalBarChart
+from scales import format_tick, load_scales, log_limits, log_ticks
+
+# Renders every chart listed in a job spec from one load of the data and
+# through one process pool. The spec is a JSON (or, with PyYAML installed,
+# YAML) list of tasks:
+#
+#   [{"chart": "comparison", "indicators": ["land cover", "agricultural emissions"],
+#     "years": [1992, 2022], "output_dir": "Batch_Graphs/Country_Graphs"},
+#    {"chart": "bars", "indicators": ["land cover", "agricultural emissions", "population"],
+#     "years": [2015, 2021], "output_dir": "Batch_Graphs/Country_Horizontal_Bar_Graphs_{year}"}]
+#
+# "comparison" draws the first indicator against the second over the year
+# range, one chart per country (like Graph1.py); "bars" draws one chart per
+# country and year in the range (like Graph4.py). "years" is an inclusive
+# [first, last] pair and may be left out to cover every year; output_dir
+# may contain {year}. Keep output_dir apart from the directories of
+# Graph1.py and Graph4.py: a chart's build manifest entry records the task
+# that drew it, so sharing a directory with a script re-renders every chart
+# each time the other one runs.
+
+# Axis and bar labels for every indicator a task may name
+INDICATOR_LABELS = {
+    'land cover': 'Land Cover (1000 hectares)',
+    'agricultural emissions': 'Emissions (kilotons)',
+    'population': 'Population',
+    PER_CAPITA: 'Emissions per Capita (tonnes)',
+    PER_HECTARE: 'Emissions per Hectare (tonnes)',
+    rolling_column('land cover'): 'Land Cover, 5-Year Mean (1000 hectares)',
+    rolling_column('agricultural emissions'): 'Emissions, 5-Year Mean (kilotons)',
+    CUMULATIVE_EMISSIONS: 'Cumulative Emissions (kilotons)',
+}
+
+# Indicators mostly below 1, whose log axes start a decade under their
+# smallest positive value rather than at 1
+RATIO_INDICATORS = [PER_CAPITA, PER_HECTARE]
+
+CHARTS = ['comparison', 'bars']
+
+# Tasks and global axis limits, set by set_tasks() in the main process and
+# in every render worker
+tasks = []
+limits = {}
+
+# Chart templates reused for every chart rendered by this process, by task
+templates = {}
+
+def load_spec(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            import yaml
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+
+    for number, task in enumerate(spec):
+        if task.get('chart') not in CHARTS:
+            raise ValueError(f"task {number}: chart must be one of {CHARTS}")
+        unknown = [name for name in task.get('indicators', []) if name not in INDICATOR_LABELS]
+        if unknown or not task.get('indicators'):
+            raise ValueError(f"task {number}: unknown or missing indicators {unknown}; choose from {list(INDICATOR_LABELS)}")
+        if task['chart'] == 'comparison' and len(task['indicators']) != 2:
+            raise ValueError(f"task {number}: a comparison chart takes exactly two indicators")
+        if 'output_dir' not in task:
+            raise ValueError(f"task {number}: output_dir is required")
+
+    # Comparison charts are named after the country alone
+    directories = [task['output_dir'] for task in spec if task['chart'] == 'comparison']
+    if len(directories) != len(set(directories)):
+        raise ValueError("comparison tasks need distinct output directories")
+    return spec
+
+def axis_limits(scales, indicators):
+    # (lower, upper) log-axis limits per indicator, from the shared scales
+    return {name: log_limits(scales['columns'][name], below_one=name in RATIO_INDICATORS) for name in indicators}
+
+def set_tasks(task_list, limit_table):
+    global tasks, limits
+    tasks = task_list
+    limits = limit_table
+    for chart in templates.values():
+        chart.close()
+    templates.clear()
+
+def output_path_for(task_number, year, country):
+    task = tasks[task_number]
+    directory = task['output_dir'].format(year=year)
+    if task['chart'] == 'comparison':
+        return os.path.join(directory, f"{country}_comparison.png")
+    return os.path.join(directory, f"{country}_comparison_{year}.png")
+
+def template_for(task_number, year):
+    task = tasks[task_number]
+    chart = templates.get(task_number)
+    if chart is None:
+        labels = [INDICATOR_LABELS[name] for name in task['indicators']]
+        if task['chart'] == 'comparison':
+            first, second = task['indicators']
+            chart = ComparisonChart(limits[first][1], limits[second][1], labels=labels,
+                                    title=f"Comparison of {labels[0]} and {labels[1]} in {{country}}",
+                                    lower_limits=(limits[first][0], limits[second][0]))
+        else:
+            chart = HorizontalBarChart(year, labels=labels, title="{country} ({year})")
+        templates[task_number] = chart
+    if task['chart'] == 'bars':
+        chart.year = year
+    return chart
+
+def render_chart(country, country_data, task_number, year):
+    # One chart of one task: country_data holds the country's rows for the
+    # task's year range (comparison) or for the single year (bars)
+    if country_data.empty:
+        return None
+    task = tasks[task_number]
+    chart = template_for(task_number, year)
+    output_path = output_path_for(task_number, year, country)
+    if task['chart'] == 'comparison':
+        first, second = task['indicators']
+        chart.render(country, country_data['year'], country_data[first].fillna(0),
+                     country_data[second].fillna(0), output_path)
+    else:
+        values = country_data[task['indicators']].fillna(0).iloc[0].tolist()
+        chart.render(country, values, output_path)
+    return output_path
+
+def expand(data, spec):
+    # Every group of the cross product as (task number, year, [(country, slice), ...]);
+    # a comparison task is one group labelled with its last year
+    all_years = sorted(data['year'].unique())
+    for number, task in enumerate(spec):
+        first, last = task.get('years', [all_years[0], all_years[-1]])
+        rows = data[(data['year'] >= first) & (data['year'] <= last)]
+        columns = ['area', 'year'] + task['indicators']
+        if task['chart'] == 'comparison':
+            yield number, last, partition_by_area(rows[columns])
+        else:
+            for year, year_rows in rows[columns].groupby('year'):
+                yield number, int(year), partition_by_area(year_rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every chart in a job spec of indicator pairs, years and output directories.")
+    parser.add_argument('spec', help="JSON (or YAML) list of chart tasks")
+    parser.add_argument('--workers', type=int, default=1, help="number of render processes (default: 1)")
+    parser.add_argument('--force', action='store_true', help="re-render charts whose inputs have not changed")
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+
+    spec = load_spec(args.spec)
+
+    # Load the enriched data once; every indicator's global limits come from
+    # the scales cached with it
+    data = load_enriched()
+    indicators = {name for task in spec for name in task['indicators']}
+    with stage('axis_limits'):
+        set_tasks(spec, axis_limits(load_scales(enriched=True, data=data), indicators))
+    # Aggregates and areas the loader found to be sums of others get no chart
+    data = data[~data['area'].isin(skipped_areas(snapshot_checks()))]
+
+    # The whole cross product is scheduled as one batch; charts whose inputs,
+    # task and limits are unchanged are skipped
+    manifests = {}
+    jobs = []
+    for number, year, partition in expand(data, spec):
+        directory = os.path.dirname(output_path_for(number, year, ''))
+        os.makedirs(directory, exist_ok=True)
+        manifest = manifests.setdefault(directory, BuildManifest(directory))
+        task = spec[number]
+        params = {'task': task, 'year': year, 'limits': {name: limits[name] for name in task['indicators']}}
+        stale = manifest.stale_jobs(partition, [render_chart, ComparisonChart, HorizontalBarChart, log_ticks, format_tick],
+                                    lambda country, number=number, year=year: output_path_for(number, year, country),
+                                    params, force=args.force)
+        jobs += [(country, country_data, number, year) for country, country_data in stale]
+
+    render_batch(render_chart, jobs, workers=args.workers, initializer=set_tasks, initargs=(tasks, limits),
+                 verbose=not args.quiet)
+    for manifest in manifests.values():
+        manifest.save()
+    report(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import instrumentation
+
+
+def _init_worker(initializer, initargs, settings):
+    # Worker processes only ever write files, so use the non-interactive backend
+    import matplotlib
+    matplotlib.use('Agg')
+    instrumentation.configure(**settings)
+    # A forked worker inherits the parent's events; only report its own
+    instrumentation.take_events()
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def _timed_render(render, job):
+    # Returns the saved path, the wall time and any stage events recorded
+    # while drawing (so worker timings reach the parent's summary)
+    start = time.perf_counter()
+    with instrumentation.profiled(job[0]), instrumentation.stage('render', job[0]):
+        output_path = render(*job)
+    return output_path, time.perf_counter() - start, instrumentation.take_events()
+
+
+def _report(jobs, results, timings, verbose):
+    # Print each chart as its result arrives, in job order
+    for job, (output_path, elapsed, events) in zip(jobs, results):
+        instrumentation.add_events(events)
+        label = job[0]
+        if output_path is None:
+            print(f"No data found for {label}")
+            continue
+        if verbose:
+            with instrumentation.stage('print', label):
+                print(f"Saved plot for {label} at {output_path} ({elapsed:.3f}s)")
+        timings.append((label, elapsed))
+
+
+def render_batch(render, jobs, workers=1, initializer=None, initargs=(), verbose=True):
+    # Call render(*job) for every job and report per-chart and total wall time.
+    # The first element of each job labels the chart (e.g. the country name),
+    # and render returns the saved path or None when nothing was drawn.
+    # With more than one worker the jobs are spread over a process pool;
+    # initializer(*initargs) prepares the shared state in each worker.
+    # verbose=False drops the line printed per saved chart.
+    jobs = list(jobs)
+    start = time.perf_counter()
+
+    timings = []
+    if workers > 1:
+        chunksize = max(1, len(jobs) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(initializer, initargs, instrumentation.settings())) as pool:
+            results = pool.map(_timed_render, repeat(render), jobs, chunksize=chunksize)
+            _report(jobs, results, timings, verbose)
+    else:
+        _report(jobs, (_timed_render(render, job) for job in jobs), timings, verbose)
+
+    total = time.perf_counter() - start
+    print(f"Rendered {len(timings)} charts in {total:.2f}s with {workers} worker(s)")
+    return timings
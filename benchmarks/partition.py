@@ -0,0 +1,56 @@
+# Compare per-country boolean filtering with a single group-by partition.
+# Run from the repository root:  python -m benchmarks.partition [--scales 1 10 100]
+import argparse
+import time
+
+import pandas as pd
+
+from data_loader import load_data, partition_by_area
+
+
+def scale_dataset(data, factor):
+    # Grow the dataset by repeating every area under a numbered alias, which
+    # multiplies both the row count and the number of countries
+    if factor == 1:
+        return data
+    copies = []
+    for i in range(factor):
+        copy = data.copy()
+        if i:
+            copy['area'] = copy['area'] + f" #{i}"
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def filter_per_country(data):
+    # The old batch path: one full boolean scan per country
+    return [(country, data[data['area'] == country]) for country in data['area'].unique()]
+
+
+def best_of(func, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark per-country filtering against group-by partitioning.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    base = load_data()
+    print(f"{'scale':>6} {'rows':>10} {'areas':>7} {'filter (s)':>11} {'groupby (s)':>12} {'speedup':>8}")
+    for factor in args.scales:
+        data = scale_dataset(base, factor)
+        filtered = best_of(filter_per_country, data, args.repeat)
+        grouped = best_of(partition_by_area, data, args.repeat)
+        print(f"{factor:>6} {len(data):>10} {data['area'].nunique():>7} "
+              f"{filtered:>11.3f} {grouped:>12.3f} {filtered / grouped:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+# Stage-by-stage benchmark of the whole chart pipeline on synthetic sources.
+# Run from the repository root:
+#   python -m benchmarks.pipeline [--scales 1 10 100] [--output benchmark_results.json]
+#                                 [--compare previous_results.json]
+# Each stage records wall time, peak traced memory and output sizes; the
+# results are written as JSON so two runs can be compared.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use('Agg')
+import pandas as pd
+
+from aggregates import continent_cube, series_by_area
+from benchmarks.synthetic import SCALES, generate
+from countries import CONTINENT_FILE, map_continents
+from data_loader import SOURCE_FILE, load_data, parse_source, partition_by_area
+from render_engine import ComparisonChart, HorizontalBarChart
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POPULATION_FILE = "country-by-population.json"
+
+# HTML generators, run end to end as scripts: (script, page it writes)
+HTML_SCRIPTS = [
+    ("Graph3.py", "interactive_graph_with_dropdown_1992_onwards.html"),
+    ("pie-continent-graph.py", "interactive_pie_chart_with_adjusted_labels.html"),
+    ("Interactive graph.py", "final_v2_logarithmic.html"),
+    ("dashboard.py", "dashboard.html"),
+]
+
+
+def path_size(path):
+    if os.path.isdir(path):
+        return sum(path_size(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+class StageTimer:
+    # Collects {stage: {"seconds", "peak_bytes", ...}} for one scale
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, **extra):
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = dict(extra)
+        yield result
+        result['seconds'] = time.perf_counter() - start
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        self.stages[name] = result
+        print(f"  {name:<22} {result['seconds']:>9.3f}s {result['peak_bytes'] / 2**20:>9.1f} MiB")
+
+
+def run_script(script, workspace):
+    # Run one of the top-level scripts in the workspace, silencing its output
+    argv, cwd = sys.argv, os.getcwd()
+    sys.argv = [script]
+    os.chdir(workspace)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            runpy.run_path(os.path.join(REPO_DIR, script), run_name='__main__')
+    finally:
+        sys.argv = argv
+        os.chdir(cwd)
+
+
+def benchmark_scale(scale, workspace, render_sample):
+    timer = StageTimer()
+    source = os.path.join(workspace, SOURCE_FILE)
+    cache_dir = os.path.join(workspace, '.graph_cache')
+    for name in (CONTINENT_FILE, POPULATION_FILE):
+        shutil.copy(os.path.join(REPO_DIR, name), workspace)
+
+    with timer.stage('generate') as stage:
+        stage['rows'] = generate(source, scale)
+    stage['source_bytes'] = os.path.getsize(source)
+
+    with timer.stage('parse_csv'):
+        parse_source(source)
+    with timer.stage('snapshot_build') as stage:
+        load_data(source, cache_dir)
+    stage['snapshot_bytes'] = path_size(cache_dir)
+    with timer.stage('snapshot_load'):
+        data = load_data(source, cache_dir)
+
+    with timer.stage('continent_mapping'):
+        continents = map_continents(data['area'], os.path.join(workspace, CONTINENT_FILE), cache_dir)
+    data = data.assign(continent=continents)
+
+    with timer.stage('aggregation'):
+        continent_cube(data)
+        series_by_area(data)
+    with timer.stage('partition') as stage:
+        partitions = partition_by_area(data)
+    stage['areas'] = len(partitions)
+
+    # Rendering every country at 100x would take hours; time a sample and
+    # report the rate
+    sample = partitions[:render_sample]
+    limits = (data['land cover'].max(), data['agricultural emissions'].max())
+    with tempfile.TemporaryDirectory() as output_dir:
+        with timer.stage('render_comparison', charts=len(sample)) as stage:
+            chart = ComparisonChart(*limits)
+            for number, (country, country_data) in enumerate(sample):
+                chart.render(country, country_data['year'], country_data['land cover'],
+                             country_data['agricultural emissions'], os.path.join(output_dir, f"{number}.png"))
+            chart.close()
+        stage['charts_per_second'] = len(sample) / stage['seconds']
+        stage['output_bytes'] = path_size(output_dir)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        with timer.stage('render_bars', charts=len(sample)) as stage:
+            chart = HorizontalBarChart(2021)
+            for number, (country, country_data) in enumerate(sample):
+                row = country_data.iloc[-1]
+                chart.render(country, [row['land cover'], row['agricultural emissions'], 0],
+                             os.path.join(output_dir, f"{number}.png"))
+            chart.close()
+        stage['charts_per_second'] = len(sample) / stage['seconds']
+        stage['output_bytes'] = path_size(output_dir)
+
+    for script, page in HTML_SCRIPTS:
+        name = 'html_' + os.path.splitext(script)[0].replace(' ', '_').replace('-', '_').lower()
+        with timer.stage(name) as stage:
+            run_script(script, workspace)
+        stage['output_bytes'] = os.path.getsize(os.path.join(workspace, page))
+
+    return timer.stages
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, previous):
+    # Print the time ratio of every stage present in both runs
+    print(f"\nCompared with {previous['environment'].get('commit')} ({previous['environment'].get('timestamp')}):")
+    for scale, stages in results['scales'].items():
+        for name, stage in stages.items():
+            before = previous['scales'].get(scale, {}).get(name)
+            if before and before['seconds'] > 0:
+                ratio = stage['seconds'] / before['seconds']
+                flag = '  <-- slower' if ratio > 1.2 else ''
+                print(f"  {scale:>4}x {name:<22} {before['seconds']:>9.3f}s -> {stage['seconds']:>9.3f}s ({ratio:.2f}x){flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark load, mapping, aggregation, rendering and HTML stages.")
+    parser.add_argument('--scales', type=int, nargs='+', choices=sorted(SCALES), default=[1, 10])
+    parser.add_argument('--render-sample', type=int, default=20, help="charts rendered per chart type (default: 20)")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='JSON', help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = {'environment': environment(), 'scales': {}}
+    tracemalloc.start()
+    try:
+        for scale in args.scales:
+            print(f"Scale {scale}x")
+            with tempfile.TemporaryDirectory() as workspace:
+                results['scales'][str(scale)] = benchmark_scale(scale, workspace, args.render_sample)
+    finally:
+        tracemalloc.stop()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+    print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
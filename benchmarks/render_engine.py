@@ -0,0 +1,74 @@
+# Charts per second with a fresh figure per chart (the old path: build,
+# lay out, save, close) versus one reused chart template.
+# Run from the repository root:  python -m benchmarks.render_engine [--countries 40]
+import argparse
+import os
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+
+from data_loader import load_data, partition_by_area
+from render_engine import ComparisonChart, HorizontalBarChart
+
+
+def comparison_jobs(data, count):
+    return [(country, country_data) for country, country_data in partition_by_area(data)[:count]]
+
+
+def render_comparison(jobs, limits, output_dir, reuse):
+    chart = ComparisonChart(*limits) if reuse else None
+    for country, country_data in jobs:
+        if not reuse:
+            chart = ComparisonChart(*limits)
+        chart.render(country, country_data['year'], country_data['land cover'],
+                     country_data['agricultural emissions'], os.path.join(output_dir, f"{country}.png"))
+        if not reuse:
+            chart.close()
+    if reuse:
+        chart.close()
+
+
+def render_horizontal(jobs, output_dir, reuse):
+    chart = HorizontalBarChart(2021) if reuse else None
+    for country, country_data in jobs:
+        if not reuse:
+            chart = HorizontalBarChart(2021)
+        values = [country_data['land cover'].iloc[0], country_data['agricultural emissions'].iloc[0], 0]
+        chart.render(country, values, os.path.join(output_dir, f"{country}_2021.png"))
+        if not reuse:
+            chart.close()
+    if reuse:
+        chart.close()
+
+
+def charts_per_second(func, count, *args):
+    start = time.perf_counter()
+    func(*args)
+    return count / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the reusable chart templates against a fresh figure per chart.")
+    parser.add_argument('--countries', type=int, default=40)
+    args = parser.parse_args(argv)
+
+    data = load_data()
+    limits = (data['land cover'].max(), data['agricultural emissions'].max())
+    jobs = comparison_jobs(data, args.countries)
+    jobs_2021 = comparison_jobs(data[data['year'] == 2021], args.countries)
+
+    print(f"{'chart':>12} {'fresh (charts/s)':>17} {'template (charts/s)':>20} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as output_dir:
+        fresh = charts_per_second(render_comparison, len(jobs), jobs, limits, output_dir, False)
+        reused = charts_per_second(render_comparison, len(jobs), jobs, limits, output_dir, True)
+        print(f"{'comparison':>12} {fresh:>17.2f} {reused:>20.2f} {reused / fresh:>7.2f}x")
+
+        fresh = charts_per_second(render_horizontal, len(jobs_2021), jobs_2021, output_dir, False)
+        reused = charts_per_second(render_horizontal, len(jobs_2021), jobs_2021, output_dir, True)
+        print(f"{'horizontal':>12} {fresh:>17.2f} {reused:>20.2f} {reused / fresh:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Synthetic "Comparison Query.txt"-shaped sources for benchmarking.
+#   python -m benchmarks.synthetic --scale 10 --output synthetic_10x.txt
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from countries import CONTINENT_FILE
+
+# scale -> (country multiplier, year multiplier); the row count grows by the
+# product of the two. The source format carries a single indicator pair, so
+# extra indicator series show up as extra (synthetic) areas.
+SCALES = {1: (1, 1), 10: (5, 2), 100: (10, 10)}
+BASE_YEARS = 31
+LAST_YEAR = 2022
+MISSING_RATE = 0.01
+
+
+def synthetic_frame(scale, seed=0):
+    # Build the frame in memory; area names reuse the reference country list
+    # so continent resolution behaves as it does on real data
+    country_factor, year_factor = SCALES[scale]
+    with open(CONTINENT_FILE, 'r', encoding='utf-8') as f:
+        base_names = [entry['country'] for entry in json.load(f)]
+    areas = [name if i == 0 else f"{name} (synthetic {i})"
+             for i in range(country_factor) for name in base_names]
+    years = np.arange(LAST_YEAR - BASE_YEARS * year_factor + 1, LAST_YEAR + 1)
+
+    rng = np.random.default_rng(seed)
+    area_column = np.repeat(np.asarray(areas, dtype=object)[None, :], len(years), axis=0).ravel()
+    year_column = np.repeat(years, len(areas)).astype(np.float64)
+
+    # Log-normal levels per area with a small random walk over the years
+    levels = rng.normal(11, 2.5, size=(2, len(areas)))
+    drift = rng.normal(0, 0.02, size=(2, len(years), len(areas))).cumsum(axis=1)
+    land_cover = np.exp(levels[0] + drift[0]).ravel()
+    emissions = np.exp(levels[1] + drift[1]).ravel()
+    emissions[rng.random(emissions.size) < MISSING_RATE] = np.nan
+
+    return pd.DataFrame({
+        'year': year_column,
+        'area': area_column,
+        'land cover': land_cover,
+        'agricultural emissions': emissions,
+    })
+
+
+def generate(path, scale, seed=0):
+    # Write a synthetic source in the same layout as the FAOSTAT extract:
+    # year as "1992.00", quoted area names, two decimals, latin1
+    frame = synthetic_frame(scale, seed)
+    columns = [frame['year'].map('{:.2f}'.format),
+               '"' + frame['area'].str.replace('"', '""') + '"']
+    for column in ('land cover', 'agricultural emissions'):
+        columns.append(frame[column].map('{:.2f}'.format).where(frame[column].notna(), ''))
+    lines = columns[0].str.cat(columns[1:], sep=',')
+    with open(path, 'w', encoding='latin1', newline='') as f:
+        f.write('\n'.join(lines))
+        f.write('\n')
+    return len(frame)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic Comparison Query-shaped source file.")
+    parser.add_argument('--scale', type=int, choices=sorted(SCALES), default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args(argv)
+    rows = generate(args.output, args.scale, args.seed)
+    print(f"Wrote {rows} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import hashlib
+import inspect
+import json
+import os
+
+import pandas as pd
+
+from instrumentation import stage
+
+# One manifest per output directory, recording the inputs of every chart in it
+MANIFEST_FILE = ".build_manifest.json"
+
+
+def render_digest(frame, sources, params):
+    # Hash of a chart's inputs: its data slice, the source of the functions
+    # and classes that draw it (so styling changes invalidate every chart)
+    # and any extra parameters such as global axis limits or the year filter
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    for source in sources:
+        digest.update(inspect.getsource(source).encode('utf-8'))
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_FILE)
+        self.entries = {}
+        self.pending = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+
+    def stale_jobs(self, jobs, sources, output_path, params, force=False):
+        # Keep only the (area, slice) jobs whose output is missing or whose
+        # inputs changed since it was written; output_path(area) names the
+        # file and sources lists the code that draws it
+        stale = []
+        for job in jobs:
+            path = output_path(job[0])
+            with stage('manifest_hash', job[0]):
+                digest = render_digest(job[1], sources, params)
+            if force or self.entries.get(os.path.basename(path)) != digest or not os.path.exists(path):
+                stale.append(job)
+                self.pending[os.path.basename(path)] = digest
+        skipped = len(jobs) - len(stale)
+        if skipped:
+            print(f"Skipping {skipped} up-to-date charts")
+        return stale
+
+    def save(self):
+        # Record the charts returned by stale_jobs() once they have been rendered
+        self.entries.update(self.pending)
+        self.pending = {}
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1, sort_keys=True)
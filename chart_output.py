@@ -0,0 +1,121 @@
+import io
+import os
+import time
+import xml.etree.ElementTree as ET
+
+import matplotlib
+
+from instrumentation import stage
+
+# Output backends for the per-country generators: one PNG per chart (the
+# default), every chart as a page of one PDF, or every chart as a symbol of
+# one SVG sprite sheet. The collections are written in one pass by the main
+# process, so fonts and glyph outlines are stored once for all charts.
+FORMATS = ['png', 'pdf', 'svg']
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+
+# Charts per row when the sprite sheet is viewed directly
+SPRITE_COLUMNS = 4
+
+
+def add_output_arguments(parser):
+    # Command-line options shared by the per-country generators
+    parser.add_argument('--format', choices=FORMATS, default='png',
+                        help="png: one file per chart (default); pdf: one multi-page PDF; svg: one SVG sprite sheet")
+    parser.add_argument('--dpi', type=int,
+                        help="resolution of PNG output and of any rasterised content (default: matplotlib's savefig.dpi)")
+
+
+def save_options(output_format='png', dpi=None):
+    # Keyword arguments for Figure.savefig()
+    options = {} if output_format == 'png' else {'format': output_format}
+    if dpi is not None:
+        options['dpi'] = dpi
+    return options
+
+
+def collection_path(output_dir, output_format):
+    # "Country_Graphs_Updated" -> "Country_Graphs_Updated.pdf"
+    return os.path.normpath(output_dir) + '.' + output_format
+
+
+class SvgSprite:
+    # Collects single-chart SVG documents and writes them as <symbol>s of one
+    # document. Definitions (glyph outlines, clip paths, markers) shared by
+    # several charts are written once; clip path ids are content hashes as
+    # long as svg.hashsalt is fixed, which write_collection() ensures.
+    def __init__(self):
+        self.definitions = {}
+        self.symbols = []
+        self.size = None
+
+    def add(self, label, svg_bytes):
+        root = ET.fromstring(svg_bytes)
+        parents = {child: parent for parent in root.iter() for child in parent}
+        for element in list(root.iter()):
+            if element.tag == '{%s}defs' % SVG_NS:
+                for definition in element:
+                    self.definitions.setdefault(definition.get('id'), definition)
+            if element.tag in ('{%s}defs' % SVG_NS, '{%s}metadata' % SVG_NS):
+                parents[element].remove(element)
+        # Body ids ("figure_1", "axes_1", ...) repeat in every chart
+        for element in root.iter():
+            element.attrib.pop('id', None)
+
+        symbol = ET.Element('{%s}symbol' % SVG_NS, id=f"chart-{len(self.symbols)}", viewBox=root.get('viewBox'))
+        title = ET.SubElement(symbol, '{%s}title' % SVG_NS)
+        title.text = str(label)
+        symbol.extend(list(root))
+        self.symbols.append(symbol)
+        if self.size is None:
+            _, _, width, height = root.get('viewBox').split()
+            self.size = (float(width), float(height))
+
+    def write(self, path):
+        ET.register_namespace('', SVG_NS)
+        ET.register_namespace('xlink', XLINK_NS)
+        width, height = self.size or (0, 0)
+        rows = -(-len(self.symbols) // SPRITE_COLUMNS)
+        sheet = ET.Element('{%s}svg' % SVG_NS, version='1.1',
+                           viewBox=f"0 0 {width * min(len(self.symbols), SPRITE_COLUMNS):g} {height * rows:g}")
+        defs = ET.SubElement(sheet, '{%s}defs' % SVG_NS)
+        defs.extend(self.definitions.values())
+        sheet.extend(self.symbols)
+        # A grid of the charts, each also addressable as #chart-N
+        for number, symbol in enumerate(self.symbols):
+            ET.SubElement(sheet, '{%s}use' % SVG_NS, {
+                '{%s}href' % XLINK_NS: '#' + symbol.get('id'),
+                'x': f"{width * (number % SPRITE_COLUMNS):g}", 'y': f"{height * (number // SPRITE_COLUMNS):g}",
+                'width': f"{width:g}", 'height': f"{height:g}",
+            })
+        ET.ElementTree(sheet).write(path, encoding='utf-8', xml_declaration=True)
+
+
+def write_collection(path, output_format, jobs, render):
+    # Draw every (label, data) job into one multi-page PDF or one SVG sprite
+    # sheet. render(label, data, output) must save one chart to the file
+    # object it is given, in output_format (see save_options()).
+    start = time.perf_counter()
+    count = 0
+    if output_format == 'pdf':
+        from matplotlib.backends.backend_pdf import PdfPages
+        with PdfPages(path) as pdf:
+            for job in jobs:
+                with stage('collection_page', job[0]):
+                    if render(*job, output=pdf) is not None:
+                        count += 1
+    else:
+        sprite = SvgSprite()
+        with matplotlib.rc_context({'svg.hashsalt': 'sprite'}):
+            for job in jobs:
+                output = io.BytesIO()
+                with stage('collection_page', job[0]):
+                    if render(*job, output=output) is not None:
+                        sprite.add(job[0], output.getvalue())
+                        count += 1
+        with stage('collection_write'):
+            sprite.write(path)
+    print(f"Wrote {count} charts to {path} ({os.path.getsize(path) / 2**20:.1f} MiB) "
+          f"in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,242 @@
+import json
+import os
+import re
+
+from data_loader import CACHE_DIR, file_digest
+from instrumentation import stage
+
+# Reference files keyed by country name
+CONTINENT_FILE = "country-by-continent.json"
+POPULATION_FILE = "country-by-population.json"
+UNKNOWN = "Unknown"
+
+# Persisted area -> value lookup tables, one per reference field, rebuilt
+# when LOOKUP_VERSION (the matching rules) changes
+LOOKUP_FILE = "{field}_lookup.json"
+LOOKUP_VERSION = 2
+
+# FAOSTAT area names that differ from the names used in the reference JSON
+# files. Populations are joined on exact names and these aliases only, so
+# renamed countries are listed even where the longest-match fallback finds
+# them for continents; former and multi-country areas ("Serbia and
+# Montenegro", "Sudan (former)") are deliberately absent.
+ALIASES = {
+    "Bolivia (Plurinational State of)": "Bolivia",
+    "British Virgin Islands": "Virgin Islands, British",
+    "Brunei Darussalam": "Brunei",
+    "Cabo Verde": "Cape Verde",
+    "Chagos Archipelago": "British Indian Ocean Territory",
+    "China, Hong Kong SAR": "Hong Kong",
+    "China, Macao SAR": "Macao",
+    "China, mainland": "China",
+    "Czechia": "Czech Republic",
+    "Côte d'Ivoire": "Ivory Coast",
+    "Democratic People's Republic of Korea": "North Korea",
+    "Democratic Republic of the Congo": "The Democratic Republic of Congo",
+    "Falkland Islands (Malvinas)": "Falkland Islands",
+    "Fiji": "Fiji Islands",
+    "Heard and McDonald Islands": "Heard Island and McDonald Islands",
+    "Holy See": "Holy See (Vatican City State)",
+    "Iran (Islamic Republic of)": "Iran",
+    "Johnston Island": "United States Minor Outlying Islands",
+    "Lao People's Democratic Republic": "Laos",
+    "Midway Island": "United States Minor Outlying Islands",
+    "Netherlands (Kingdom of the)": "Netherlands",
+    "Netherlands Antilles (former)": "Netherlands Antilles",
+    "Republic of Korea": "South Korea",
+    "Republic of Moldova": "Moldova",
+    "Russian Federation": "Russia",
+    "Réunion": "Reunion",
+    "Saint Helena, Ascension and Tristan da Cunha": "Saint Helena",
+    "Syrian Arab Republic": "Syria",
+    "Timor-Leste": "East Timor",
+    "Türkiye": "Turkey",
+    "United Kingdom of Great Britain and Northern Ireland": "United Kingdom",
+    "United Republic of Tanzania": "Tanzania",
+    "United States Virgin Islands": "Virgin Islands, U.S.",
+    "United States of America": "United States",
+    "Venezuela (Bolivarian Republic of)": "Venezuela",
+    "Viet Nam": "Vietnam",
+    "Wake Island": "United States Minor Outlying Islands",
+    "Wallis and Futuna Islands": "Wallis and Futuna",
+}
+
+# FAOSTAT areas that are aggregates of other areas in the extract (regions,
+# country groups, and "China", which FAOSTAT reports alongside "China,
+# mainland", "China, Taiwan Province of" and the two SARs). They have no
+# continent, so continent figures do not count their members twice;
+# validation.py reports any other area that matches the sum of its parts.
+AGGREGATES = {
+    "Africa", "Americas", "Asia", "Europe", "Oceania", "World",
+    "Caribbean", "Central America", "Central Asia", "Eastern Africa", "Eastern Asia", "Eastern Europe",
+    "Melanesia", "Micronesia", "Middle Africa", "Northern Africa", "Northern America", "Northern Europe",
+    "Polynesia", "South America", "South-eastern Asia", "Southern Africa", "Southern Asia",
+    "Southern Europe", "Western Africa", "Western Asia", "Western Europe", "Australia and New Zealand",
+    "European Union (27)", "Least Developed Countries", "Land Locked Developing Countries",
+    "Small Island Developing States", "Low Income Food Deficit Countries",
+    "Net Food Importing Developing Countries", "Annex I countries", "Non-Annex I countries", "OECD",
+    "China",
+}
+
+
+def country_key(name):
+    # Normalised join key: case-folded ASCII words only. The source file is
+    # read as latin1 and its accented letters arrive damaged ("Cï¿½te"), so
+    # every non-ASCII character is dropped on both sides of the join.
+    name = name.replace('ï¿½', '').casefold()
+    name = name.encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r"[^a-z0-9]+", ' ', name.replace("'", '')).split())
+
+
+def load_reference(path, field):
+    # Map normalised country key -> (reference name, field value)
+    with open(path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    return {country_key(entry['country']): (entry['country'], entry[field]) for entry in entries}
+
+
+class CountryIndex:
+    # Resolves area names to entries of a reference file: exact key first,
+    # then the alias table, then (with substrings=True) the longest
+    # reference name contained in the area as whole words (ties broken
+    # alphabetically, so the result never depends on file order)
+
+    def __init__(self, reference, substrings=True):
+        self.reference = reference
+        self.substrings = substrings
+        self.aliases = {country_key(area): country_key(name) for area, name in ALIASES.items()}
+        keys = sorted(reference, key=lambda key: (-len(key), key))
+        # A single alternation, longest names first, inside a lookahead: the
+        # scan consumes nothing, so it yields the longest name starting at
+        # every word, including names overlapping an earlier match
+        self.pattern = re.compile(r'\b(?=(' + '|'.join(re.escape(key) for key in keys) + r')\b)')
+
+    def exact_match(self, area):
+        # The reference key for the area's own name or its alias, or None
+        key = country_key(area)
+        if key in self.reference:
+            return key
+        alias = self.aliases.get(key)
+        return alias if alias in self.reference else None
+
+    def match(self, area):
+        # Returns the matching reference key, or None
+        key = self.exact_match(area)
+        if key is not None or not self.substrings:
+            return key
+        key = country_key(area)
+        candidates = [m.group(1) for m in self.pattern.finditer(key)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda candidate: (-len(candidate), candidate))
+
+    def lookup(self, areas):
+        # Map each unique area to its reference value; unresolved areas are
+        # left out
+        result = {}
+        for area in set(areas):
+            key = self.match(area)
+            if key is not None:
+                result[area] = self.reference[key][1]
+        return result
+
+
+def resolve_reference(areas, reference_file, field, default, cache_dir=CACHE_DIR, substrings=True):
+    # Return {area: value of field} for the given areas, or default for
+    # areas the reference file does not cover (see CountryIndex for
+    # substrings). Results are persisted in the cache directory; an area is
+    # only resolved (and, if unresolved, reported) the first time it is seen
+    # for a given reference file.
+    lookup_path = os.path.join(cache_dir, LOOKUP_FILE.format(field=field))
+    version = {'reference_sha256': file_digest(reference_file), 'aliases': sorted(ALIASES.items()),
+               'substrings': substrings, 'lookup_version': LOOKUP_VERSION}
+
+    table = {}
+    if os.path.exists(lookup_path):
+        with open(lookup_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        # The table is rebuilt whenever the reference file, aliases or matching rules change
+        if cached['version'] == json.loads(json.dumps(version)):
+            table = cached['areas']
+
+    missing = [area for area in set(areas) if area not in table]
+    if missing:
+        index = CountryIndex(load_reference(reference_file, field), substrings)
+        resolved = index.lookup(missing)
+        unresolved = sorted(area for area in missing if area not in resolved)
+        if unresolved:
+            print(f"Areas without a {field} (reported once, see " + lookup_path + "):")
+            for area in unresolved:
+                print(f"- {area}")
+        table.update({area: resolved.get(area, default) for area in missing})
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(lookup_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'areas': table}, f, ensure_ascii=False, indent=1)
+
+    return {area: table[area] for area in set(areas)}
+
+
+def resolve_continents(areas, continent_file=CONTINENT_FILE, cache_dir=CACHE_DIR):
+    # Return {area: continent}, UNKNOWN for unresolved areas and None for
+    # aggregates (left out of every continent grouping)
+    areas = set(areas)
+    lookup = resolve_reference(areas - AGGREGATES, continent_file, 'continent', UNKNOWN, cache_dir)
+    lookup.update(dict.fromkeys(areas & AGGREGATES))
+    return lookup
+
+
+def resolve_populations(areas, population_file=POPULATION_FILE, cache_dir=CACHE_DIR):
+    # Return {area: population}, None for unresolved areas. Only exact names
+    # and aliases count: a name containing another country's ("Serbia and
+    # Montenegro", "China, Taiwan Province of") must not take its population.
+    return resolve_reference(areas, population_file, 'population', None, cache_dir, substrings=False)
+
+
+def join_checks(continents, populations, continent_file=CONTINENT_FILE, population_file=POPULATION_FILE):
+    # Join problems in the lookups returned by resolve_continents() and
+    # resolve_populations(), aggregates left out:
+    #   {"join_failures": {field: [areas not resolved]},
+    #    "fuzzy_joins": {field: [[area, reference name], ...]}}
+    # Fuzzy joins are areas resolved only by the longest-name fallback
+    # ("China, Taiwan Province of" -> "China"), which may be another
+    # country; populations are never joined this way.
+    areas = sorted(set(continents) - AGGREGATES)
+    checks = {
+        'join_failures': {
+            'continent': [area for area in areas if continents[area] == UNKNOWN],
+            'population': [area for area in areas if populations.get(area) is None],
+        },
+        'fuzzy_joins': {},
+    }
+    for field, reference_file, substrings in (('continent', continent_file, True),
+                                              ('population', population_file, False)):
+        index = CountryIndex(load_reference(reference_file, field), substrings)
+        checks['fuzzy_joins'][field] = []
+        for area in areas:
+            key = index.match(area)
+            if key is not None and index.exact_match(area) is None:
+                checks['fuzzy_joins'][field].append([area, index.reference[key][0]])
+    return checks
+
+
+def skipped_areas(checks=None):
+    # Areas that get no chart of their own: the listed aggregates and, given
+    # the loader's findings (data_loader.snapshot_checks()), any other area
+    # found to be the sum of its parts
+    flagged = {entry['area'] for entry in checks['sums_of_parts'] if entry['matches_parts']} if checks else set()
+    return AGGREGATES | flagged
+
+
+def map_continents(areas, continent_file=CONTINENT_FILE, cache_dir=CACHE_DIR):
+    # Vectorised continent column for a Series of area names
+    with stage('continent_mapping'):
+        lookup = resolve_continents(areas.unique(), continent_file, cache_dir)
+        return areas.map(lookup)
+
+
+def with_continents(chunks, continent_file=CONTINENT_FILE, cache_dir=CACHE_DIR):
+    # Add the continent column to every chunk of a streamed source
+    for chunk in chunks:
+        chunk['continent'] = map_continents(chunk['area'], continent_file, cache_dir)
+        yield chunk
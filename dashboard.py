@@ -0,0 +1,293 @@
+import argparse
+import os
+
+from aggregates import VALUE_COLUMNS, continent_cube, dashboard_payload
+from enrichment import CUMULATIVE_EMISSIONS, growth_column, load_continent_trends, load_enriched, rolling_column
+from html_output import DECODER_SCRIPT, add_encoding_arguments, add_plotly_arguments, payload_script, plotly_script_tag, to_js
+from scales import load_scales, log_axis
+
+# Output page
+output_file = "dashboard.html"
+
+# The continent charts cover the same years as Graph3.py and the pie page
+first_continent_year = 1992
+
+# Continent trend metrics offered on the page: (column, label, scale factor)
+trend_metrics = [
+    (rolling_column('agricultural emissions'), 'Average emissions, 5-year mean (kilotons)', 1),
+    (rolling_column('land cover'), 'Average land cover, 5-year mean (1000 hectares)', 1),
+    (growth_column('agricultural emissions'), 'Average emissions, year-over-year growth (%)', 100),
+    (CUMULATIVE_EMISSIONS, 'Cumulative emissions (kilotons)', 1),
+]
+
+def trend_payload(table):
+    # {"continents": [...], "years": [...], "metrics": {label: [[...]]}} from
+    # the cached continent trend table, each matrix indexed [continent][year]
+    table = table[table['year'] >= first_continent_year]
+    continents = sorted(table['continent'].unique())
+    years = sorted(int(year) for year in table['year'].unique())
+    metrics = {}
+    for column, label, factor in trend_metrics:
+        matrix = table.pivot(index='continent', columns='year', values=column).reindex(index=continents, columns=years)
+        metrics[label] = [[None if value != value else float(value) * factor for value in row]
+                          for row in matrix.to_numpy()]
+    return {'continents': continents, 'years': years, 'metrics': metrics}
+
+def build_html(payload, trends, axis, plotly_tag, encoding='json', compression='none'):
+    # The continent bar chart, the continent pie and the country explorer all
+    # read the one embedded payload: the charts index its year x continent
+    # cube (see aggregates.continent_cube), the explorer its rows
+    years = payload['cube']['years']
+    countries = sorted(payload['strings'][i] for i in payload['area'])
+    return f"""
+<!DOCTYPE html>
+<html>
+<head>
+    {plotly_tag}
+    <style>
+        body {{
+            font-family: Arial, sans-serif;
+            text-align: center;
+        }}
+        select {{
+            margin: 20px;
+            padding: 10px;
+        }}
+        .row {{
+            display: flex;
+            flex-wrap: wrap;
+            justify-content: center;
+        }}
+        .row > div {{
+            flex: 1 1 600px;
+        }}
+    </style>
+</head>
+<body>
+    <h1>Land Cover and Agricultural Emissions</h1>
+
+    <h2>By Continent</h2>
+    <select id="year-dropdown" onchange="updateContinentCharts()">
+        {"".join([f'<option value="{year}">{year}</option>' for year in years])}
+    </select>
+    <div class="row">
+        <div id="continent-bars"></div>
+        <div id="continent-pie"></div>
+    </div>
+
+    <h2>Continent Trends</h2>
+    <select id="trend-dropdown" onchange="updateTrendChart()">
+        {"".join([f'<option value="{label}">{label}</option>' for column, label, factor in trend_metrics])}
+    </select>
+    <div id="trend-plot"></div>
+
+    <h2>By Country</h2>
+    <select id="country-dropdown" onchange="updateCountryChart()">
+        <option value="">Select a country</option>
+        {"".join([f'<option value="{country}">{country}</option>' for country in countries])}
+    </select>
+    <div id="country-plot"></div>
+
+    <script>
+{DECODER_SCRIPT if encoding != 'json' or compression != 'none' else ''}
+        // Names are stored once in payload.strings; payload.area indexes
+        // into it. Area i owns rows payload.offsets[i] to
+        // payload.offsets[i + 1] of the year and value arrays.
+        // payload.cube.sum[column][year][continent] and
+        // payload.cube.count[year][continent] hold the continent figures.
+        let payload = null;
+        let areaIndex = new Map();
+        const payloadReady = {payload_script(payload, ['year'] + VALUE_COLUMNS, encoding, compression, output_file)};
+
+        // Precomputed continent trends: trends.metrics[label][continent][year]
+        const trends = {to_js(trends)};
+
+        // Shared log-axis ticks, and each country's y range in whole decades
+        const axis = {to_js(axis)};
+
+        function updateTrendChart() {{
+            const label = document.getElementById("trend-dropdown").value;
+            const traces = trends.continents.map((continent, i) => ({{
+                x: trends.years,
+                y: trends.metrics[label][i],
+                type: 'scatter',
+                mode: 'lines',
+                name: continent
+            }}));
+            Plotly.newPlot('trend-plot', traces, {{
+                title: label,
+                xaxis: {{ title: 'Year' }}
+            }});
+        }}
+
+        function continentTotalsForYear(year) {{
+            // {{continent: {{count, landCover, emissions}}}} for one year, read from the cube
+            const cube = payload.cube;
+            const i = cube.years.indexOf(year);
+            const totals = {{}};
+            cube.continents.forEach((continent, j) => {{
+                if (i >= 0 && cube.count[i][j] > 0) {{
+                    totals[continent] = {{
+                        count: cube.count[i][j],
+                        landCover: cube.sum['land cover'][i][j],
+                        emissions: cube.sum['agricultural emissions'][i][j]
+                    }};
+                }}
+            }});
+            return totals;
+        }}
+
+        function updateContinentCharts() {{
+            if (!payload) {{
+                return;
+            }}
+            const year = parseInt(document.getElementById("year-dropdown").value);
+            const totals = continentTotalsForYear(year);
+            const continents = Object.keys(totals).sort();
+
+            const landCoverTrace = {{
+                x: continents,
+                y: continents.map(c => totals[c].landCover / totals[c].count),
+                type: 'bar',
+                name: 'Average Land Cover (1000 hectares)',
+                marker: {{ color: 'blue' }}
+            }};
+            const emissionsTrace = {{
+                x: continents,
+                y: continents.map(c => totals[c].emissions / totals[c].count),
+                type: 'bar',
+                name: 'Average Emissions (kilotons)',
+                marker: {{ color: 'orange' }}
+            }};
+            Plotly.newPlot('continent-bars', [landCoverTrace, emissionsTrace], {{
+                title: `Average Land Cover and Emissions by Continent for ${{year}}`,
+                yaxis: {{ type: 'log', tickvals: axis.tickvals, ticktext: axis.ticktext }},
+                barmode: 'group'
+            }});
+
+            const pieTrace = {{
+                labels: continents,
+                values: continents.map(c => totals[c].emissions),
+                type: 'pie',
+                textinfo: 'label+percent',
+                hoverinfo: 'label+value',
+                textposition: 'outside',
+                insidetextorientation: 'horizontal',
+                automargin: true
+            }};
+            Plotly.newPlot('continent-pie', [pieTrace], {{
+                title: `Agricultural Emissions by Continent for ${{year}} (% of global)`,
+                margin: {{ l: 40, r: 40, t: 80, b: 40 }},
+                showlegend: true
+            }});
+        }}
+
+        function updateCountryChart() {{
+            const selectedCountry = document.getElementById("country-dropdown").value;
+            if (!payload) {{
+                return;
+            }}
+            if (!areaIndex.has(selectedCountry)) {{
+                document.getElementById("country-plot").innerHTML = "<p>Please select a valid country.</p>";
+                return;
+            }}
+            const i = areaIndex.get(selectedCountry);
+            const start = payload.offsets[i];
+            const end = payload.offsets[i + 1];
+            // Plain arrays, whichever way the columns were embedded
+            const years = Array.from(payload.year.slice(start, end));
+            const landCover = Array.from(payload['land cover'].slice(start, end));
+            const emissions = Array.from(payload['agricultural emissions'].slice(start, end));
+
+            // Format values in "k" or "M" notation for hover labels
+            const formatValues = values => values.map(v => {{
+                if (v >= 1e6) {{
+                    return (v / 1e6).toFixed(2) + 'M'; // Millions
+                }} else if (v >= 1e3) {{
+                    return (v / 1e3).toFixed(2) + 'k'; // Thousands
+                }} else {{
+                    return v.toFixed(2); // Plain value
+                }}
+            }});
+
+            const landCoverTrace = {{
+                x: years,
+                y: landCover,
+                text: formatValues(landCover),
+                type: 'bar',
+                name: 'Land Cover (1000 hectares)',
+                marker: {{ color: 'blue' }},
+                hovertemplate: 'Land Cover: %{{text}}<br>Year: %{{x}}<extra></extra>'
+            }};
+            const emissionsTrace = {{
+                x: years,
+                y: emissions,
+                text: formatValues(emissions),
+                type: 'bar',
+                name: 'Agricultural Emissions (kilotons)',
+                marker: {{ color: 'orange' }},
+                hovertemplate: 'Emissions: %{{text}}<br>Year: %{{x}}<extra></extra>'
+            }};
+            Plotly.newPlot('country-plot', [landCoverTrace, emissionsTrace], {{
+                title: `Statistics for ${{selectedCountry}}`,
+                xaxis: {{
+                    title: 'Year',
+                    tickangle: 45,
+                    dtick: 1
+                }},
+                yaxis: {{
+                    title: 'Values (Logarithmic Scale)',
+                    type: 'log',
+                    tickvals: axis.tickvals,
+                    ticktext: axis.ticktext,
+                    range: axis.ranges[selectedCountry]
+                }},
+                barmode: 'group',
+                margin: {{
+                    b: 100
+                }}
+            }});
+        }}
+
+        updateTrendChart();
+
+        // Initialize the continent charts with the default year once the
+        // payload is decoded
+        payloadReady.then(decoded => {{
+            payload = decoded;
+            areaIndex = new Map(Array.from(payload.area, (name, i) => [payload.strings[name], i]));
+            updateContinentCharts();
+            if (document.getElementById("country-dropdown").value) {{
+                updateCountryChart();
+            }}
+        }});
+    </script>
+</body>
+</html>
+"""
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate one page with the continent charts and the country explorer.")
+    add_plotly_arguments(parser)
+    add_encoding_arguments(parser)
+    args = parser.parse_args(argv)
+
+    # Load the enriched data and the continent trend table (both served from
+    # their cached snapshots)
+    data = load_enriched()
+    payload = dashboard_payload(data[['year', 'area'] + VALUE_COLUMNS])
+    # Continent sums and counts per year, aggregated once here rather than
+    # from every row in the browser (aggregates have no continent)
+    payload['cube'] = continent_cube(data[data['year'] >= first_continent_year], stats=('sum', 'count'))
+    trends = trend_payload(load_continent_trends())
+    axis = log_axis(load_scales())
+
+    # Save the HTML file
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(build_html(payload, trends, axis, plotly_script_tag(output_file, args.plotly, args.plotly_js),
+                           args.encoding, args.compress))
+
+    print(f"Dashboard saved as {output_file} ({os.path.getsize(output_file) / 1024:.1f} KB).")
+
+if __name__ == '__main__':
+    main()
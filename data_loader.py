@@ -0,0 +1,290 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from aggregates import AreaChecks, RowChecks
+from instrumentation import stage
+
+# Source file and column layout shared by every graph script
+SOURCE_FILE = "Comparison Query.txt"
+COLUMNS = ["year", "area", "land cover", "agricultural emissions"]
+NUMERIC_COLUMNS = ["land cover", "agricultural emissions"]
+
+# Type hints for the streaming reader, so chunks never need re-inference
+CSV_DTYPES = {"area": str, "land cover": np.float64, "agricultural emissions": np.float64}
+DEFAULT_CHUNKSIZE = 1_000_000
+
+# Parsed snapshots are kept here, one sub-directory per source file
+CACHE_DIR = ".graph_cache"
+SNAPSHOT_VERSION = 4
+
+# Tables kept in memory between calls by a long-running process, enabled by
+# keep_in_memory(): {key: (signature, table)}
+memory = None
+
+
+def file_digest(path, block_size=1 << 20):
+    # SHA-256 of a file, read in blocks so large extracts are not loaded at once
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def clean(data):
+    # The cleaning every script used to repeat: numeric year, missing values
+    # as 0. Rows without a usable year are dropped rather than drawn as year
+    # 0 (validation.py lists them).
+    data['year'] = pd.to_numeric(data['year'], errors='coerce')
+    data.dropna(subset=['year'], inplace=True)
+    data.fillna(0, inplace=True)
+    data['year'] = data['year'].astype(np.int32)
+    for col in NUMERIC_COLUMNS:
+        if col in data:
+            data[col] = data[col].astype(np.float64)
+    return data
+
+
+def parse_source(file_name=SOURCE_FILE, checks=None, area_checks=None):
+    # Parse the whole CSV at once. checks (e.g. an aggregates.RowChecks) is
+    # updated with the raw rows before cleaning hides what was missing,
+    # area_checks (e.g. an aggregates.AreaChecks) with the cleaned rows.
+    with stage('parse_csv'):
+        raw = pd.read_csv(file_name, names=COLUMNS, encoding='latin1')
+    if checks is not None:
+        with stage('row_checks'):
+            checks.update(raw)
+    with stage('clean'):
+        data = clean(raw)
+    if area_checks is not None:
+        with stage('area_checks'):
+            area_checks.update(data)
+    return data
+
+
+def stream_data(file_name=SOURCE_FILE, chunksize=DEFAULT_CHUNKSIZE, usecols=None,
+                year=None, min_year=None, areas=None):
+    # Read the CSV in chunks, yielding each cleaned chunk with the year/area
+    # filters already applied, so only one raw chunk is ever held in memory.
+    # usecols limits parsing to the needed columns ("year" is always read).
+    if usecols is not None:
+        usecols = ['year'] + [col for col in usecols if col != 'year']
+    dtypes = {col: dtype for col, dtype in CSV_DTYPES.items() if usecols is None or col in usecols}
+    reader = pd.read_csv(file_name, names=COLUMNS, encoding='latin1', usecols=usecols,
+                         dtype=dtypes, chunksize=chunksize)
+    while True:
+        with stage('parse_chunk'):
+            chunk = next(reader, None)
+            if chunk is None:
+                return
+            chunk = clean(chunk)
+        with stage('filter_chunk'):
+            if year is not None:
+                chunk = chunk[chunk['year'] == year]
+            if min_year is not None:
+                chunk = chunk[chunk['year'] >= min_year]
+            if areas is not None:
+                chunk = chunk[chunk['area'].isin(areas)]
+        if not chunk.empty:
+            yield chunk
+
+
+def read_filtered(file_name=SOURCE_FILE, chunksize=DEFAULT_CHUNKSIZE, **filters):
+    # Stream the source and keep only the rows passing the filters
+    chunks = list(stream_data(file_name, chunksize, **filters))
+    if not chunks:
+        return clean(pd.DataFrame({col: pd.Series(dtype=np.float64) for col in COLUMNS}))
+    return pd.concat(chunks, ignore_index=True)
+
+
+def add_stream_arguments(parser):
+    # Command-line options for scripts that can bypass the snapshot
+    parser.add_argument('--stream', action='store_true',
+                        help="read the source in chunks with filters pushed down, for extracts too large for memory")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f"rows per chunk in --stream mode (default: {DEFAULT_CHUNKSIZE})")
+
+
+def _column_file(column, generation):
+    return f"{column.replace(' ', '_')}.{generation}.npy"
+
+
+def _replace_file(path, write):
+    # write(f) into a temporary file next to path, then move it into place,
+    # so readers see either the old file or the complete new one
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        write(f)
+    os.replace(temp_path, path)
+
+
+def write_meta(snapshot_dir, meta):
+    _replace_file(os.path.join(snapshot_dir, 'meta.json'),
+                  lambda f: f.write(json.dumps(meta).encode('utf-8')))
+
+
+def write_snapshot(data, snapshot_dir, meta):
+    # Store each column as a typed .npy array; string columns are stored as
+    # integer codes plus a label table. Every write uses new column file
+    # names and meta.json is replaced last, pointing at them: a reader sees
+    # the previous snapshot or the new one, never a mix, and processes still
+    # memory-mapping the previous files keep them until they let go (a file
+    # rewritten in place under a map would crash them with SIGBUS).
+    os.makedirs(snapshot_dir, exist_ok=True)
+    generation = f"{time.time_ns():x}{os.getpid():x}"
+    previous = _read_meta(snapshot_dir) or {}
+
+    columns = {}
+    files = {}
+    for column in data.columns:
+        values = data[column]
+        if pd.api.types.is_numeric_dtype(values):
+            array = values.to_numpy()
+            columns[column] = 'numeric'
+        else:
+            codes, labels = pd.factorize(values)
+            array = codes.astype(np.int32)
+            columns[column] = [str(label) for label in labels]
+        files[column] = _column_file(column, generation)
+        _replace_file(os.path.join(snapshot_dir, files[column]), lambda f: np.save(f, array))
+
+    write_meta(snapshot_dir, dict(meta, version=SNAPSHOT_VERSION, rows=len(data), columns=columns, files=files))
+
+    # Unlink the previous generation's columns (or those of the older
+    # fixed-name layout); mapped copies stay readable.
+    # Files of a writer racing this one are left alone.
+    old_files = previous.get('files') or {column: column.replace(' ', '_') + '.npy'
+                                          for column in previous.get('columns', {})}
+    for name in set(old_files.values()) - set(files.values()):
+        try:
+            os.remove(os.path.join(snapshot_dir, name))
+        except OSError:
+            # Already gone, or still mapped on a platform that forbids this
+            pass
+
+
+def _read_meta(snapshot_dir):
+    meta_path = os.path.join(snapshot_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_snapshot(snapshot_dir):
+    # Returns (meta, frame), or (None, None) when no complete snapshot exists
+    meta = _read_meta(snapshot_dir)
+    if meta is None or meta.get('version') != SNAPSHOT_VERSION:
+        return None, None
+
+    frame = {}
+    for column, kind in meta['columns'].items():
+        # Copy-on-write memory map: the file is never modified, but callers
+        # may still update the frame in place
+        try:
+            values = np.load(os.path.join(snapshot_dir, meta['files'][column]), mmap_mode='c')
+        except FileNotFoundError:
+            # Replaced by a newer snapshot since meta.json was read
+            return None, None
+        if kind == 'numeric':
+            frame[column] = values
+        else:
+            # Missing strings are stored as code -1, which takes the trailing None
+            frame[column] = np.asarray(kind + [None], dtype=object).take(values)
+    return meta, pd.DataFrame(frame, copy=False)
+
+
+def _snapshot_dir(file_name, cache_dir):
+    name = os.path.basename(os.path.abspath(file_name)).replace(' ', '_')
+    return os.path.join(cache_dir, name)
+
+
+def snapshot_digest(file_name=SOURCE_FILE, cache_dir=CACHE_DIR):
+    # SHA-256 of the source as recorded by its current snapshot (call after
+    # load_data()), so derived caches can key on it without re-hashing
+    meta_path = os.path.join(_snapshot_dir(file_name, cache_dir), 'meta.json')
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)['sha256']
+
+
+def snapshot_checks(file_name=SOURCE_FILE, cache_dir=CACHE_DIR):
+    # The findings recorded while the current snapshot was parsed (call
+    # after load_data()): aggregates.RowChecks' result merged with
+    # aggregates.AreaChecks'
+    meta_path = os.path.join(_snapshot_dir(file_name, cache_dir), 'meta.json')
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)['checks']
+
+
+def keep_in_memory():
+    # Reuse tables loaded earlier by this process while their inputs are
+    # unchanged (e.g. across watch cycles), instead of re-reading snapshots
+    global memory
+    if memory is None:
+        memory = {}
+
+
+def from_memory(key, signature, build):
+    # build() once per signature while keep_in_memory() is on. Callers get a
+    # shallow copy, so added columns never reach the kept table.
+    if memory is None:
+        return build()
+    entry = memory.get(key)
+    if entry is None or entry[0] != signature:
+        entry = memory[key] = (signature, build())
+    return entry[1].copy(deep=False)
+
+
+def partition_by_area(data):
+    # Split the frame into one slice per area in a single pass, keeping the
+    # order in which areas first appear
+    with stage('partition'):
+        return list(data.groupby('area', sort=False))
+
+
+def load_data(file_name=SOURCE_FILE, cache_dir=CACHE_DIR):
+    # Serve the cleaned dataset from the on-disk snapshot, re-parsing the
+    # source only when its contents have changed
+    stat = os.stat(file_name)
+    return from_memory(('source', os.path.abspath(file_name)), (stat.st_size, stat.st_mtime_ns),
+                       lambda: _load_data(file_name, cache_dir, stat))
+
+
+def _load_data(file_name, cache_dir, stat):
+    snapshot_dir = _snapshot_dir(file_name, cache_dir)
+    with stage('snapshot_load'):
+        meta, data = read_snapshot(snapshot_dir)
+
+    if meta is not None and meta['size'] == stat.st_size:
+        if meta['mtime_ns'] == stat.st_mtime_ns:
+            return data
+        # The file was touched; only trust the snapshot if the hash agrees
+        with stage('hash_source'):
+            digest = file_digest(file_name)
+        if meta['sha256'] == digest:
+            meta['mtime_ns'] = stat.st_mtime_ns
+            write_meta(snapshot_dir, meta)
+            return data
+    else:
+        with stage('hash_source'):
+            digest = file_digest(file_name)
+
+    # The raw and cleaned rows are checked in the same scan and the findings
+    # kept with the snapshot (see snapshot_checks())
+    checks = RowChecks(NUMERIC_COLUMNS)
+    area_checks = AreaChecks(NUMERIC_COLUMNS)
+    data = parse_source(file_name, checks, area_checks)
+    with stage('snapshot_write'):
+        write_snapshot(data, snapshot_dir, {
+            'source': os.path.abspath(file_name),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest,
+            'checks': dict(checks.result(), **area_checks.result()),
+        })
+    return data
@@ -0,0 +1,170 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from aggregates import VALUE_COLUMNS
+from countries import (AGGREGATES, ALIASES, CONTINENT_FILE, POPULATION_FILE, join_checks, resolve_continents,
+                       resolve_populations)
+from data_loader import (CACHE_DIR, SOURCE_FILE, file_digest, from_memory, load_data, read_snapshot,
+                         snapshot_digest, write_snapshot)
+from instrumentation import stage
+
+# Derived columns: tonnes of agricultural emissions per person and per
+# hectare of land cover (emissions are in kilotons, land cover in 1000 ha)
+PER_CAPITA = "emissions per capita"
+PER_HECTARE = "emissions per hectare"
+
+# Trend columns, derived per area (and per continent) over sorted years:
+# a trailing mean over the last TREND_WINDOW years (of those present, so a
+# gap shortens the window), year-over-year growth as a fraction (NaN after
+# a gap in the years or from a zero), and the running total of emissions
+TREND_WINDOW = 5
+CUMULATIVE_EMISSIONS = "cumulative emissions"
+EMISSIONS_TOTAL = "agricultural emissions total"
+
+ENRICHMENT_VERSION = 5
+
+
+def rolling_column(column, window=TREND_WINDOW):
+    return f"{column} {window}y mean"
+
+
+def growth_column(column):
+    return f"{column} yoy growth"
+
+
+def rolling_mean(ordered, key, columns, window=TREND_WINDOW):
+    # Trailing mean of each column over `window` years for the rows of
+    # `ordered` (sorted by key and year): each key's values are spread over
+    # every year of its span, missing years as NaN, which the mean skips
+    values = ordered.groupby([key, 'year'], sort=False)[columns].mean()
+    span = ordered.groupby(key, sort=False)['year'].agg(['min', 'max'])
+    years = [np.arange(first, last + 1) for first, last in zip(span['min'], span['max'])]
+    grid = pd.MultiIndex.from_arrays([np.repeat(span.index, [len(span_years) for span_years in years]),
+                                      np.concatenate(years) if years else []], names=[key, 'year'])
+    means = values.reindex(grid).groupby(level=key, sort=False).rolling(window, min_periods=1).mean().droplevel(0)
+    return means.reindex(pd.MultiIndex.from_frame(ordered[[key, 'year']])).set_axis(ordered.index)
+
+
+def add_trends(data, key, columns=VALUE_COLUMNS, cumulative='agricultural emissions', window=TREND_WINDOW):
+    # Add the rolling mean and growth of each column and the running total
+    # of `cumulative`, per value of `key`, in one grouped pass over the
+    # table sorted by (key, year); rows keep their original order
+    with stage('trends'):
+        ordered = data.sort_values([key, 'year'], kind='stable')
+        grouped = ordered.groupby(key, sort=False)
+        rolling = rolling_mean(ordered, key, columns, window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = grouped[columns].pct_change().replace([np.inf, -np.inf], np.nan)
+        growth = growth.where(grouped['year'].diff() == 1)
+        trends = {rolling_column(column, window): rolling[column] for column in columns}
+        trends.update((growth_column(column), growth[column]) for column in columns)
+        trends[CUMULATIVE_EMISSIONS] = grouped[cumulative].cumsum()
+        return data.assign(**trends)
+
+
+def continent_trends(data, window=TREND_WINDOW):
+    # Per (continent, year): the average of each value column over the
+    # continent's areas (as in Graph2.py and Graph3.py), the emissions total,
+    # and their trends; the cumulative column accumulates the total
+    grouped = data.groupby(['continent', 'year'])
+    table = grouped[VALUE_COLUMNS].mean()
+    table[EMISSIONS_TOTAL] = grouped['agricultural emissions'].sum()
+    return add_trends(table.reset_index(), 'continent', cumulative=EMISSIONS_TOTAL, window=window)
+
+
+def enrich(data, continent_file=CONTINENT_FILE, population_file=POPULATION_FILE, cache_dir=CACHE_DIR, checks=None):
+    # Add continent, population, the per-capita and per-hectare columns and
+    # the per-area trends. Both reference files are joined through the
+    # normalised country-key index, once per unique area; the ratios are
+    # computed for every year at once. Population and the ratios are NaN
+    # where unknown. checks, a dict, receives the join problems (see
+    # countries.join_checks()).
+    with stage('enrich'):
+        areas = data['area'].unique()
+        continents = resolve_continents(areas, continent_file, cache_dir)
+        populations = resolve_populations(areas, population_file, cache_dir)
+        if checks is not None:
+            checks.update(join_checks(continents, populations, continent_file, population_file))
+
+        population = data['area'].map(populations).astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            per_capita = data['agricultural emissions'] * 1000 / population.where(population > 0)
+            per_hectare = data['agricultural emissions'] / data['land cover'].where(data['land cover'] > 0)
+        data = data.assign(**{
+            'continent': data['area'].map(continents),
+            'population': population,
+            PER_CAPITA: per_capita,
+            PER_HECTARE: per_hectare,
+        })
+    return add_trends(data, 'area')
+
+
+def cache_key(file_name, continent_file, population_file, cache_dir):
+    # Everything the enriched tables depend on
+    key = {
+        'source_sha256': snapshot_digest(file_name, cache_dir),
+        'continent_sha256': file_digest(continent_file),
+        'population_sha256': file_digest(population_file),
+        'aliases': sorted(ALIASES.items()),
+        'aggregates': sorted(AGGREGATES),
+        'enrichment_version': ENRICHMENT_VERSION,
+    }
+    return json.loads(json.dumps(key))
+
+
+def _table_dir(file_name, suffix, cache_dir):
+    return os.path.join(cache_dir, os.path.basename(os.path.abspath(file_name)).replace(' ', '_') + suffix)
+
+
+def _cached_table(file_name, suffix, key, cache_dir, build, meta=None):
+    # Serve a derived table from memory (see data_loader.keep_in_memory())
+    # or its snapshot while the key matches, otherwise build and store it;
+    # meta is stored with a new snapshot once build() has run
+    snapshot_dir = _table_dir(file_name, suffix, cache_dir)
+    return from_memory(('table', os.path.abspath(snapshot_dir)), json.dumps(key, sort_keys=True),
+                       lambda: _load_table(snapshot_dir, key, build, meta))
+
+
+def _load_table(snapshot_dir, key, build, meta=None):
+    with stage('snapshot_load'):
+        stored, table = read_snapshot(snapshot_dir)
+    if stored is not None and stored.get('key') == key:
+        return table
+
+    table = build()
+    with stage('snapshot_write'):
+        write_snapshot(table, snapshot_dir, dict(meta or {}, key=key))
+    return table
+
+
+def load_enriched(file_name=SOURCE_FILE, continent_file=CONTINENT_FILE, population_file=POPULATION_FILE,
+                  cache_dir=CACHE_DIR):
+    # The enriched table for the whole source, served from its own snapshot
+    # until the source, either reference file or the alias table changes
+    data = load_data(file_name, cache_dir)
+    key = cache_key(file_name, continent_file, population_file, cache_dir)
+    # The join problems found while enriching are kept with the snapshot
+    # (see enriched_checks())
+    checks = {}
+    return _cached_table(file_name, '.enriched', key, cache_dir,
+                         lambda: enrich(data, continent_file, population_file, cache_dir, checks),
+                         {'join_checks': checks})
+
+
+def enriched_checks(file_name=SOURCE_FILE, cache_dir=CACHE_DIR):
+    # The join problems (see countries.join_checks()) recorded when the
+    # current enriched snapshot was built (call after load_enriched())
+    with open(os.path.join(_table_dir(file_name, '.enriched', cache_dir), 'meta.json'), 'r', encoding='utf-8') as f:
+        return json.load(f)['join_checks']
+
+
+def load_continent_trends(file_name=SOURCE_FILE, continent_file=CONTINENT_FILE, population_file=POPULATION_FILE,
+                          cache_dir=CACHE_DIR):
+    # The per-continent trend table (see continent_trends()), cached like
+    # the enriched table it is derived from
+    enriched = load_enriched(file_name, continent_file, population_file, cache_dir)
+    key = cache_key(file_name, continent_file, population_file, cache_dir)
+    return _cached_table(file_name, '.continent_trends', key, cache_dir, lambda: continent_trends(enriched))
@@ -0,0 +1,74 @@
+import argparse
+import importlib.util
+import os
+import sys
+
+# Single entry point for every generator:
+#   python graphs.py render countries --workers 4
+#   python graphs.py render explorer --sharded
+#   python graphs.py serve --port 8050
+#   python graphs.py watch
+# Arguments after the command are passed to that script's main(). Only the
+# selected script is imported, so the HTML commands never load matplotlib
+# or plotly, and nothing heavy is imported to parse the command line.
+
+# command -> (script, what it writes)
+COMMANDS = {
+    'countries': ("Graph1.py", "land cover vs emissions chart per country (PNG)"),
+    'bars': ("Graph4.py", "2021 land cover, emissions and population chart per country (PNG)"),
+    'continent-chart': ("Graph2.py", "one year's continent averages chart (matplotlib window)"),
+    'continents': ("Graph3.py", "continent averages page with a year dropdown (HTML)"),
+    'pie': ("pie-continent-graph.py", "continent emissions pie chart page (HTML)"),
+    'explorer': ("Interactive graph.py", "per-country explorer page (HTML)"),
+    'dashboard': ("dashboard.py", "continent charts and country explorer on one page (HTML)"),
+    'batch': ("batch_jobs.py", "every chart in a job spec, e.g. batch_jobs.example.json (PNG)"),
+    'validate': ("validation.py", "missing values, repeated keys, aggregates, outliers and join failures (JSON)"),
+}
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_script(script):
+    # Import a generator by path; some file names ("Interactive graph.py",
+    # "pie-continent-graph.py") are not valid module names
+    name = os.path.splitext(script)[0].replace(' ', '_').replace('-', '_')
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SCRIPT_DIR, script))
+    module = importlib.util.module_from_spec(spec)
+    # Registered before running, so functions sent to worker processes can
+    # be pickled by module name
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='graphs', description="Generate the land cover and emissions charts and pages.")
+    commands = parser.add_subparsers(dest='action', required=True)
+    render = commands.add_parser('render', help="run one generator",
+                                 description="Run one generator; its own options follow the command "
+                                             "(e.g. 'graphs render countries --help').",
+                                 formatter_class=argparse.RawDescriptionHelpFormatter,
+                                 epilog='\n'.join(f"  {command:<16} {description}"
+                                                  for command, (script, description) in COMMANDS.items()))
+    render.add_argument('command', choices=list(COMMANDS))
+    render.add_argument('options', nargs=argparse.REMAINDER, help="options for the generator")
+    # The service's and watcher's options (including --help) are left to
+    # render_service and watch
+    commands.add_parser('serve', help="run the HTTP render service (see render_service.py)", add_help=False)
+    commands.add_parser('watch', help="rebuild the outputs affected by each input edit (see watch.py)", add_help=False)
+    args, extra_options = parser.parse_known_args(argv)
+
+    # Let the generator import its sibling modules from any working directory
+    sys.path.insert(0, SCRIPT_DIR)
+    if args.action == 'serve':
+        load_script("render_service.py").main(extra_options)
+    elif args.action == 'watch':
+        load_script("watch.py").main(extra_options)
+    else:
+        if extra_options:
+            parser.error(f"unrecognized arguments: {' '.join(extra_options)}")
+        load_script(COMMANDS[args.command][0]).main(args.options)
+
+
+if __name__ == '__main__':
+    main()
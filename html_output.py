@@ -0,0 +1,273 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+import time
+import zlib
+
+import numpy as np
+
+# Unpinned CDN bundle the pages have always used
+PLOTLY_CDN = "https://cdn.plot.ly/plotly-latest.min.js"
+
+
+def to_js(obj):
+    # Compact JSON literal for embedding in a generated page
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, allow_nan=False)
+
+
+def write_shards(directory, shards):
+    # Write each value of `shards` to its own JSON file in `directory` and
+    # return {key: relative path} for the page to fetch. Files are numbered
+    # rather than named after their key so any country name is safe.
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            os.remove(os.path.join(directory, name))
+
+    index = {}
+    for number, (key, value) in enumerate(shards.items()):
+        file_name = f"{number:05d}.json"
+        with open(os.path.join(directory, file_name), 'w', encoding='utf-8') as f:
+            f.write(to_js(value))
+        index[key] = f"{os.path.basename(os.path.normpath(directory))}/{file_name}"
+    return index
+
+
+def add_plotly_arguments(parser):
+    # Command-line options shared by every HTML generator
+    parser.add_argument('--plotly', choices=['cdn', 'local'], default='cdn',
+                        help="load Plotly from the CDN (default) or from a vendored copy written next to the page")
+    parser.add_argument('--plotly-js', metavar='PATH',
+                        help="vendor this Plotly bundle (e.g. a partial bar+pie build such as plotly-basic.min.js) "
+                             "instead of the one shipped with the plotly package; implies --plotly local")
+
+
+def plotly_script_tag(output_file, mode='cdn', bundle=None):
+    # <script> tag loading Plotly for a page written to output_file. In local
+    # mode the bundle is copied next to the page under a content-hash name,
+    # so pages in the same directory share one long-cacheable file.
+    if mode == 'cdn' and bundle is None:
+        return f'<script src="{PLOTLY_CDN}"></script>'
+
+    if bundle is None:
+        # The bundle pinned by the installed plotly package
+        from plotly.offline import get_plotlyjs
+        content = get_plotlyjs().encode('utf-8')
+    else:
+        with open(bundle, 'rb') as f:
+            content = f.read()
+
+    file_name = f"plotly-{hashlib.sha256(content).hexdigest()[:16]}.min.js"
+    path = os.path.join(os.path.dirname(output_file), file_name)
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(content)
+    return f'<script src="{file_name}"></script>'
+
+
+# Numeric columns can be embedded as base64 typed arrays instead of JSON:
+#   float32: 4 bytes per value, about 7 significant digits; a column that
+#            would change by more than MAX_ERROR is stored as Float64
+#   int32:   values scaled by the fewest powers of ten that make them whole
+#            (at most MAX_DECIMALS), as Int32 where they fit and BigInt64
+#            otherwise, so two-decimal values in the hundreds of millions
+#            are exact
+# With compression (gzip or deflate, inflated in the browser with
+# DecompressionStream) the whole payload is compressed as one blob: the
+# typed columns and the JSON of everything else.
+ENCODINGS = ['json', 'float32', 'int32']
+COMPRESSIONS = ['none', 'gzip', 'deflate']
+INT32_MAX = 2**31 - 1
+# Largest integer a JS Number (and so a decoded BigInt64) holds exactly
+SAFE_INTEGER_MAX = 2**53 - 1
+MAX_DECIMALS = 6
+# Half a unit of the source's last (second) decimal
+MAX_ERROR = 0.005
+
+
+def add_encoding_arguments(parser):
+    # Command-line options for generators that embed numeric columns
+    parser.add_argument('--encoding', choices=ENCODINGS, default='json',
+                        help="embed numeric columns as JSON (default), base64 Float32 arrays (Float64 for a column "
+                             f"Float32 would change by more than {MAX_ERROR}) or exact scaled integer arrays")
+    parser.add_argument('--compress', choices=COMPRESSIONS, default='none',
+                        help="compress the whole payload; decoded with the browser's DecompressionStream")
+
+
+def _decimals(values):
+    # Fewest decimals (up to MAX_DECIMALS) that write every value exactly,
+    # or None (e.g. for NaN or values with more decimals)
+    for decimals in range(MAX_DECIMALS + 1):
+        scale = 10 ** decimals
+        if np.array_equal(np.round(values * scale) / scale, values):
+            return decimals
+    return None
+
+
+def _quantise(values):
+    # (int32 or int64 array, scale) with values == array / scale, or None
+    # when the values have too many decimals or are too large
+    if np.issubdtype(values.dtype, np.integer):
+        scaled, scale = values, 1
+    else:
+        decimals = _decimals(values)
+        if decimals is None:
+            return None
+        scale = 10 ** decimals
+        scaled = np.round(values * scale)
+    largest = float(np.abs(scaled).max()) if len(values) else 0.0
+    if largest <= INT32_MAX:
+        return scaled.astype('<i4'), scale
+    if largest <= SAFE_INTEGER_MAX:
+        return scaled.astype('<i8'), scale
+    return None
+
+
+def _encode_column(values, encoding):
+    # (typed array, layout entry) for one column, or None when no typed
+    # array holds it (integers beyond SAFE_INTEGER_MAX)
+    if encoding == 'int32' or np.issubdtype(values.dtype, np.integer):
+        quantised = _quantise(values)
+        if quantised is not None:
+            array, scale = quantised
+            return array, {'type': 'int32' if array.dtype.itemsize == 4 else 'int64', 'scale': scale}
+        if np.issubdtype(values.dtype, np.integer):
+            return None
+        return values.astype('<f8'), {'type': 'float64'}
+    array = values.astype('<f4')
+    if len(values) and np.abs(array.astype(np.float64) - values).max() > MAX_ERROR:
+        return values.astype('<f8'), {'type': 'float64'}
+    return array, {'type': 'float32'}
+
+
+DTYPES = {'float32': '<f4', 'float64': '<f8', 'int32': '<i4', 'int64': '<i8'}
+
+
+def encode_columns(columns, encoding, compression='none', rest=None):
+    # {name: sequence} -> JSON-ready blob for decodeColumns() in the page.
+    # `rest`, the JSON-ready remainder of the payload, goes into the blob's
+    # bytes (under "json") so compression covers it too; columns no typed
+    # array holds go with it, or under "plain" without a rest.
+    layout = []
+    parts = []
+    plain = {}
+    offset = 0
+    for name, values in columns.items():
+        values = np.asarray(values)
+        encoded = _encode_column(values, encoding)
+        if encoded is None:
+            plain[name] = values.tolist()
+            continue
+        array, entry = encoded
+        # Typed array views need offsets aligned to their element size
+        padding = -offset % array.itemsize
+        parts.append(bytes(padding))
+        offset += padding
+        entry.update(name=name, offset=offset, length=len(array))
+        layout.append(entry)
+        parts.append(array.tobytes())
+        offset += array.nbytes
+
+    blob = {'compression': None if compression == 'none' else compression, 'columns': layout}
+    if rest is not None:
+        text = to_js(dict(rest, **plain)).encode('utf-8')
+        blob['json'] = {'offset': offset, 'length': len(text)}
+        parts.append(text)
+        plain = {}
+    data = b''.join(parts)
+    if compression == 'gzip':
+        data = gzip.compress(data, mtime=0)
+    elif compression == 'deflate':
+        data = zlib.compress(data, 9)
+    blob.update(data=base64.b64encode(data).decode('ascii'), plain=plain)
+    return blob
+
+
+def decode_columns(blob):
+    # Python counterpart of decodeColumns(), used to time and check a blob
+    data = base64.b64decode(blob['data'])
+    if blob['compression'] == 'gzip':
+        data = gzip.decompress(data)
+    elif blob['compression'] == 'deflate':
+        data = zlib.decompress(data)
+    columns = {}
+    if 'json' in blob:
+        columns.update(json.loads(data[blob['json']['offset']:blob['json']['offset'] + blob['json']['length']]))
+    for entry in blob['columns']:
+        values = np.frombuffer(data, dtype=DTYPES[entry['type']], count=entry['length'], offset=entry['offset'])
+        columns[entry['name']] = values / entry['scale'] if entry.get('scale', 1) != 1 else values
+    columns.update((name, np.asarray(values)) for name, values in blob['plain'].items())
+    return columns
+
+
+# Decodes a blob from encode_columns() into {name: typed array}, plus the
+# blob's JSON remainder if it has one
+DECODER_SCRIPT = """
+        async function decodeColumns(blob) {
+            const started = performance.now();
+            let bytes = Uint8Array.from(atob(blob.data), c => c.charCodeAt(0));
+            if (blob.compression) {
+                const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream(blob.compression));
+                bytes = new Uint8Array(await new Response(stream).arrayBuffer());
+            }
+            const columns = blob.json
+                ? JSON.parse(new TextDecoder().decode(bytes.subarray(blob.json.offset, blob.json.offset + blob.json.length)))
+                : {};
+            for (const column of blob.columns) {
+                if (column.type === 'float32') {
+                    columns[column.name] = new Float32Array(bytes.buffer, column.offset, column.length);
+                } else if (column.type === 'float64') {
+                    columns[column.name] = new Float64Array(bytes.buffer, column.offset, column.length);
+                } else if (column.type === 'int64') {
+                    const values = new BigInt64Array(bytes.buffer, column.offset, column.length);
+                    columns[column.name] = Float64Array.from(values, v => Number(v) / column.scale);
+                } else {
+                    const values = new Int32Array(bytes.buffer, column.offset, column.length);
+                    columns[column.name] = column.scale === 1 ? values : Float64Array.from(values, v => v / column.scale);
+                }
+            }
+            Object.assign(columns, blob.plain);
+            console.log(`Decoded ${bytes.length} bytes of payload in ${(performance.now() - started).toFixed(1)} ms`);
+            return columns;
+        }
+"""
+
+
+def payload_script(payload, columns, encoding='json', compression='none', report_name=None):
+    # JS expression for a Promise of `payload`, with the listed numeric
+    # columns typed-array encoded unless encoding is 'json', and the whole
+    # payload compressed unless compression is 'none'. With report_name,
+    # print the embedded size and the time to decode it here.
+    as_json = to_js(payload)
+    if encoding == 'json' and compression == 'none':
+        expression = f"Promise.resolve({as_json})"
+        if report_name:
+            start = time.perf_counter()
+            json.loads(as_json)
+            print(f"{report_name}: payload {len(as_json.encode('utf-8')) / 1024:.1f} KB as JSON, "
+                  f"parsed in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return expression
+
+    typed = [] if encoding == 'json' else columns
+    rest = {key: value for key, value in payload.items() if key not in typed}
+    typed = {name: payload[name] for name in typed}
+    if compression == 'none':
+        blob = encode_columns(typed, encoding)
+        encoded = to_js({'rest': rest, 'blob': blob})
+        expression = f"(async () => {{ const p = {encoded}; return Object.assign(p.rest, await decodeColumns(p.blob)); }})()"
+    else:
+        blob = encode_columns(typed, encoding, compression, rest)
+        encoded = to_js(blob)
+        expression = f"decodeColumns({encoded})"
+    if report_name:
+        start = time.perf_counter()
+        parsed = json.loads(encoded)
+        decode_columns(parsed if compression != 'none' else parsed['blob'])
+        elapsed = time.perf_counter() - start
+        print(f"{report_name}: payload {len(as_json.encode('utf-8')) / 1024:.1f} KB as JSON -> "
+              f"{len(encoded) / 1024:.1f} KB as {encoding}"
+              f"{'' if compression == 'none' else '+' + compression}, decoded in {elapsed * 1000:.1f} ms"
+              + (f" (kept as JSON: {', '.join(blob['plain'])})" if blob['plain'] else ''))
+    return expression
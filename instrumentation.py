@@ -0,0 +1,198 @@
+import json
+import os
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+# Opt-in stage timings for the graph scripts. Code wraps its work in
+# `with stage('savefig'):`; while recording is off this returns a shared
+# no-op context, so the instrumented code costs next to nothing.
+#
+# Settings are module globals (set by configure(), and copied into render
+# workers by batch_render); events recorded in a worker are shipped back
+# with each chart's result.
+recording = False
+trace_memory = False
+profile_label = None
+profiler = 'cprofile'
+
+_events = []
+_open_stages = []
+_NOT_RECORDING = nullcontext()
+
+
+class _Stage:
+    def __init__(self, name, label):
+        self.name = name
+        self.label = label
+        self.child_peak = 0
+
+    def __enter__(self):
+        if trace_memory:
+            # The tracemalloc peak is global; remember the enclosing stage's
+            # peak so far before resetting it for this one
+            if _open_stages:
+                parent = _open_stages[-1]
+                parent.child_peak = max(parent.child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        _open_stages.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        _open_stages.pop()
+        event = {'stage': self.name, 'label': self.label, 'pid': os.getpid(),
+                 'start': self.start, 'seconds': seconds}
+        if trace_memory:
+            peak = max(self.child_peak, tracemalloc.get_traced_memory()[1])
+            event['peak_bytes'] = peak
+            if _open_stages:
+                parent = _open_stages[-1]
+                parent.child_peak = max(parent.child_peak, peak)
+        _events.append(event)
+        return False
+
+
+def stage(name, label=None):
+    # Time the enclosed block as one call of the named stage; label names
+    # the item being processed (e.g. the country)
+    if not recording:
+        return _NOT_RECORDING
+    return _Stage(name, label)
+
+
+def active():
+    # Whether stages are recorded or a label is profiled, for code that only
+    # splits up its work to measure the parts
+    return recording or profile_label is not None
+
+
+def settings():
+    return {'recording': recording, 'trace_memory': trace_memory,
+            'profile_label': profile_label, 'profiler': profiler}
+
+
+def configure(recording=False, trace_memory=False, profile_label=None, profiler='cprofile'):
+    globals().update(recording=recording or trace_memory, trace_memory=trace_memory,
+                     profile_label=profile_label, profiler=profiler)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def take_events():
+    # Return the events recorded so far in this process and forget them
+    global _events
+    events, _events = _events, []
+    return events
+
+
+def add_events(events):
+    # Merge events recorded in another process
+    _events.extend(events)
+
+
+class _Profile:
+    # cProfile (or pyinstrument, if installed) around the work for one label
+    def __init__(self, label):
+        self.label = label
+
+    def __enter__(self):
+        if profiler == 'pyinstrument':
+            from pyinstrument import Profiler
+            self.profiler = Profiler()
+            self.profiler.start()
+        else:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        safe_label = ''.join(c if c.isalnum() else '_' for c in str(self.label))
+        if profiler == 'pyinstrument':
+            self.profiler.stop()
+            path = f"profile_{safe_label}.html"
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.profiler.output_html())
+            print(self.profiler.output_text())
+        else:
+            import pstats
+            self.profiler.disable()
+            path = f"profile_{safe_label}.prof"
+            self.profiler.dump_stats(path)
+            pstats.Stats(self.profiler).sort_stats('cumulative').print_stats(25)
+        print(f"Profile for {self.label} saved to {path}")
+        return False
+
+
+def profiled(label):
+    # Profile the enclosed block if label is the one selected with --profile
+    if profile_label is None or str(label) != profile_label:
+        return _NOT_RECORDING
+    return _Profile(label)
+
+
+def add_instrumentation_arguments(parser):
+    # Command-line options shared by the scripts that report stage timings
+    group = parser.add_argument_group('instrumentation')
+    group.add_argument('--timings', action='store_true', help="print a per-stage timing table at the end")
+    group.add_argument('--trace', metavar='JSON',
+                       help="write every timed stage to a trace file (Chrome trace event format)")
+    group.add_argument('--trace-memory', action='store_true',
+                       help="also record the tracemalloc peak of every stage (slower)")
+    group.add_argument('--profile', metavar='LABEL',
+                       help="profile the work for a single label: one country's chart, or one year "
+                            "in Graph2.py, Graph3.py and pie-continent-graph.py")
+    group.add_argument('--profiler', choices=['cprofile', 'pyinstrument'], default='cprofile')
+    group.add_argument('--quiet', action='store_true', help="do not print a line per saved chart")
+
+
+def configure_from_args(args):
+    configure(recording=args.timings or args.trace is not None, trace_memory=args.trace_memory,
+              profile_label=args.profile, profiler=args.profiler)
+
+
+def summary(events=None):
+    # Per-stage totals: [(stage, calls, seconds, max seconds, peak bytes or None)],
+    # slowest first
+    totals = {}
+    for event in _events if events is None else events:
+        calls, seconds, slowest, peak = totals.get(event['stage'], (0, 0.0, 0.0, None))
+        if 'peak_bytes' in event:
+            peak = max(peak or 0, event['peak_bytes'])
+        totals[event['stage']] = (calls + 1, seconds + event['seconds'], max(slowest, event['seconds']), peak)
+    rows = [(name,) + values for name, values in totals.items()]
+    return sorted(rows, key=lambda row: -row[2])
+
+
+def print_summary():
+    # Nested stages are included in their parents' totals, and worker stages
+    # add up across processes, so the column does not sum to wall time
+    print(f"{'Stage':<22} {'Calls':>7} {'Total (s)':>10} {'Mean (ms)':>10} {'Max (ms)':>10} {'Peak (MiB)':>11}")
+    for name, calls, seconds, slowest, peak in summary():
+        peak_text = f"{peak / 2**20:>11.1f}" if peak is not None else f"{'-':>11}"
+        print(f"{name:<22} {calls:>7} {seconds:>10.3f} {seconds / calls * 1000:>10.2f} {slowest * 1000:>10.2f} {peak_text}")
+
+
+def write_trace(path):
+    # Chrome trace event format, viewable in chrome://tracing or Perfetto;
+    # perf_counter is system-wide, so worker events line up with the parent's
+    trace_events = []
+    for event in _events:
+        args = {key: event[key] for key in ('label', 'peak_bytes') if event.get(key) is not None}
+        trace_events.append({'name': event['stage'], 'ph': 'X', 'pid': event['pid'], 'tid': event['pid'],
+                             'ts': event['start'] * 1e6, 'dur': event['seconds'] * 1e6, 'args': args})
+    summary_rows = [{'stage': name, 'calls': calls, 'seconds': seconds, 'max_seconds': slowest, 'peak_bytes': peak}
+                    for name, calls, seconds, slowest, peak in summary()]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': trace_events, 'summary': summary_rows}, f)
+    print(f"Trace with {len(trace_events)} events saved to {path}")
+
+
+def report(args):
+    # End-of-run output requested on the command line
+    if args.timings:
+        print_summary()
+    if args.trace:
+        write_trace(args.trace)
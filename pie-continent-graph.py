@@ -1,49 +1,47 @@
-import pandas as pd
-import json
-
-# Load the data
-file_name = "Comparison Query.txt"
-columns = ["year", "area", "land cover", "agricultural emissions"]
-data = pd.read_csv(file_name, names=columns, encoding='latin1')
-data.fillna(0, inplace=True)
-
-# Ensure the 'year' column is numeric for filtering
-data['year'] = pd.to_numeric(data['year'], errors='coerce')
-
-# Filter data for years from 1992 onwards
-data = data[data['year'] >= 1992]
-
-# Load continent data
-with open('country-by-continent.json', 'r') as f:
-    continent_data = json.load(f)
-
-# Create a dictionary for continent mapping
-continent_map = {entry['country']: entry['continent'] for entry in continent_data}
-
-# Map countries to continents based on substring matching
-def get_continent(area):
-    for country, continent in continent_map.items():
-        if country in area:
-            return continent
-    return "Unknown"
-
-data['continent'] = data['area'].apply(get_continent)
-
-# Identify and print unknown countries
-unknown_countries = data[data['continent'] == "Unknown"]['area'].unique()
-if len(unknown_countries) > 0:
-    print("Countries categorized as 'Unknown':")
-    for country in unknown_countries:
-        print(f"- {country}")
-else:
-    print("No unknown countries found.")
-
-# HTML structure with dropdown and JavaScript to handle the interaction
-html_code = f"""
+import argparse
+
+from aggregates import RunningGroupSum, consume_by_year, cube_from_sums
+from countries import map_continents, with_continents
+from data_loader import add_stream_arguments, load_data, stream_data
+from html_output import add_plotly_arguments, plotly_script_tag, to_js
+from instrumentation import add_instrumentation_arguments, configure_from_args, report, stage
+
+# Output page and the one column it charts
+output_file = "interactive_pie_chart_with_adjusted_labels.html"
+columns = ['agricultural emissions']
+
+def load_cube(stream=False, chunksize=None):
+    # Pre-aggregate per-year continent emission totals so the page does no scanning
+    if stream:
+        # Accumulate the totals chunk by chunk, reading only the needed columns
+        chunks = stream_data(chunksize=chunksize, usecols=['area'] + columns, min_year=1992)
+        totals = RunningGroupSum(['year', 'continent'], columns)
+        consume_by_year(with_continents(chunks), totals)
+        return cube_from_sums(*totals.result(), columns=columns, stats=('sum',))
+
+    # Load the data (served from the cached snapshot, cleaned and typed)
+    data = load_data()
+
+    # Filter data for years from 1992 onwards
+    data = data[data['year'] >= 1992]
+
+    # Map countries to continents once per unique area (unresolved areas are
+    # reported the first time they are seen)
+    data['continent'] = map_continents(data['area'])
+
+    # Accumulated one year at a time, like the stream, so each year can be
+    # timed and profiled
+    totals = RunningGroupSum(['year', 'continent'], columns)
+    consume_by_year([data], totals)
+    return cube_from_sums(*totals.result(), columns=columns, stats=('sum',))
+
+def build_html(cube, plotly_tag):
+    # HTML structure with dropdown and JavaScript to handle the interaction
+    return f"""
 <!DOCTYPE html>
 <html>
 <head>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    {plotly_tag}
     <style>
         body {{
             font-family: Arial, sans-serif;
@@ -60,32 +58,28 @@ html_code = f"""
     
     <!-- Dropdown for year selection -->
     <select id="year-dropdown" onchange="updateGraph()">
-        {"".join([f'<option value="{int(year)}">{int(year)}</option>' for year in sorted(data['year'].unique())])}
+        {"".join([f'<option value="{year}">{year}</option>' for year in cube['years']])}
     </select>
 
     <div id="plot"></div>
 
     <script>
-        var data = {data.to_json(orient='records')};
+        // Per-year continent emission totals, indexed [year][continent]
+        var cube = {to_js(cube)};
 
         function updateGraph() {{
             var selectedYear = parseInt(document.getElementById("year-dropdown").value);
-            var filteredData = data.filter(function(row) {{
-                return row.year == selectedYear;
-            }});
-
-            var continentEmissions = aggregateEmissionsByContinent(filteredData);
+            var continentEmissions = emissionsForYear(cube.years.indexOf(selectedYear));
             updatePieChart(continentEmissions, selectedYear);
         }}
 
-        function aggregateEmissionsByContinent(data) {{
+        function emissionsForYear(i) {{
             var emissionsByContinent = {{}};
-            data.forEach(function(row) {{
-                var continent = row.continent;
-                if (!emissionsByContinent[continent]) {{
-                    emissionsByContinent[continent] = 0;
+            cube.continents.forEach(function(continent, j) {{
+                var total = cube.sum['agricultural emissions'][i][j];
+                if (total !== null) {{
+                    emissionsByContinent[continent] = total;
                 }}
-                emissionsByContinent[continent] += row['agricultural emissions'];
             }});
             return emissionsByContinent;
         }}
@@ -124,9 +118,27 @@ html_code = f"""
 </html>
 """
 
-# Save the HTML file
-output_file = "interactive_pie_chart_with_adjusted_labels.html"
-with open(output_file, "w", encoding="utf-8") as f:
-    f.write(html_code)
 
-print(f"Interactive pie chart saved as {output_file}.")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the continent emissions pie chart page with a year dropdown.")
+    add_plotly_arguments(parser)
+    add_stream_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    configure_from_args(args)
+
+    with stage('load_cube'):
+        cube = load_cube(args.stream, args.chunksize)
+
+    # Script tag for Plotly (CDN or a vendored, content-hashed local copy)
+    plotly_tag = plotly_script_tag(output_file, args.plotly, args.plotly_js)
+
+    # Save the HTML file
+    with stage('write_page'), open(output_file, "w", encoding="utf-8") as f:
+        f.write(build_html(cube, plotly_tag))
+
+    print(f"Interactive pie chart saved as {output_file}.")
+    report(args)
+
+if __name__ == '__main__':
+    main()
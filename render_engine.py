@@ -0,0 +1,144 @@
+import matplotlib.pyplot as plt
+
+from instrumentation import stage
+from scales import format_log_axis, log_ticks
+
+# Reusable chart templates: the figure, axes, scales, labels and layout are
+# built once, and each chart only updates its bars, tick labels and title
+# before saving. One template is kept per process. save_options are passed
+# to every savefig() call (e.g. format and dpi).
+
+
+class ComparisonChart:
+    # Land cover (left, blue) vs emissions (right, orange) per year, both on
+    # log scales with fixed global limits and the shared decade ticks (see
+    # scales.py). labels, title and lower_limits let other indicator pairs
+    # use the same template.
+    def __init__(self, land_cover_limit, emissions_limit, bar_width=0.4,
+                 labels=('Land Cover (1000 hectares)', 'Emissions (kilotons)'),
+                 title='Comparison of Land Cover and Emissions in {country}', lower_limits=(1, 1),
+                 save_options=None):
+        self.bar_width = bar_width
+        self.save_options = save_options or {}
+        self.labels = labels
+        self.title_format = title
+        with stage('subplots'):
+            self.fig, self.ax1 = plt.subplots(figsize=(10, 6))
+
+        # Primary axis for land cover with logarithmic scale
+        self.ax1.set_xlabel('Year', fontsize=12)
+        self.ax1.set_ylabel(labels[0], fontsize=12, color='blue')
+        self.ax1.tick_params(axis='y', labelcolor='blue')
+        self.ax1.set_yscale('log')
+        self.ax1.set_ylim(lower_limits[0], land_cover_limit)  # Avoid 0 for logarithmic scale
+        self.ax1.set_yticks(log_ticks(lower_limits[0], land_cover_limit)[0])
+        format_log_axis(self.ax1.yaxis)
+
+        # Secondary axis for emissions with logarithmic scale
+        self.ax2 = self.ax1.twinx()
+        self.ax2.set_ylabel(labels[1], fontsize=12, color='orange')
+        self.ax2.tick_params(axis='y', labelcolor='orange')
+        self.ax2.set_yscale('log')
+        self.ax2.set_ylim(lower_limits[1], emissions_limit)
+        self.ax2.set_yticks(log_ticks(lower_limits[1], emissions_limit)[0])
+        format_log_axis(self.ax2.yaxis)
+
+        self.title = self.ax2.set_title('', fontsize=14)
+        self.x_labels = None
+        self.land_cover_bars = None
+        self.emission_bars = None
+
+    def _build_bars(self, x_labels):
+        # (Re)create the bars when the set of years differs from the last chart
+        if self.land_cover_bars is not None:
+            self.land_cover_bars.remove()
+            self.emission_bars.remove()
+        positions = range(len(x_labels))
+        zeros = [0] * len(x_labels)
+        self.land_cover_bars = self.ax1.bar(positions, zeros, width=self.bar_width, label=self.labels[0],
+                                            color='blue', align='center')
+        self.emission_bars = self.ax2.bar(positions, zeros, width=self.bar_width, label=self.labels[1],
+                                          color='orange', align='edge')
+        self.ax1.set_xticks(positions)
+        self.ax1.set_xticklabels(x_labels, rotation=45, ha='right')
+        self.ax1.relim()
+        self.ax2.relim()
+        self.ax1.autoscale_view(scaley=False)
+        with stage('tight_layout'):
+            self.fig.tight_layout()
+        self.x_labels = x_labels
+
+    def render(self, country, years, land_cover, emissions, output):
+        # Draw one country's chart and save it to output (a path or file object)
+        # The title is set first so a rebuilt layout leaves room for it
+        self.title.set_text(self.title_format.format(country=country))
+        x_labels = [str(int(year)) for year in years]
+        if x_labels != self.x_labels:
+            with stage('build_bars', country):
+                self._build_bars(x_labels)
+        with stage('update_bars', country):
+            for bar, height in zip(self.land_cover_bars, land_cover):
+                bar.set_height(height)
+            for bar, height in zip(self.emission_bars, emissions):
+                bar.set_height(height)
+        with stage('savefig', country):
+            self.fig.savefig(output, **self.save_options)
+
+    def close(self):
+        plt.close(self.fig)
+
+
+class HorizontalBarChart:
+    # Land cover, emissions and population (or any other labelled values) as
+    # horizontal bars
+    labels = ['Land Cover (1000 hectares)', 'Agricultural Emissions (kilotons)', 'Population']
+    colors = ['blue', 'orange', 'green']
+
+    def __init__(self, year, labels=None,
+                 title='Comparison of Land Cover, Emissions, and Population in {country} ({year})',
+                 save_options=None):
+        self.year = year
+        self.save_options = save_options or {}
+        self.title_format = title
+        if labels is not None:
+            self.labels = list(labels)
+        colors = [self.colors[i % len(self.colors)] for i in range(len(self.labels))]
+        with stage('subplots'):
+            self.fig, self.ax = plt.subplots(figsize=(10, 6))
+        self.bars = self.ax.barh(self.labels, [0] * len(self.labels), color=colors)
+
+        # Value labels at the end of each bar, moved and rewritten per chart
+        self.value_labels = [
+            self.ax.text(0, bar.get_y() + bar.get_height() / 2, '', va='center', ha='left', fontsize=10)
+            for bar in self.bars
+        ]
+
+        self.ax.set_xlabel('Values', fontsize=12)
+        self.title = self.ax.set_title('', fontsize=14)
+        self.laid_out = False
+
+    def render(self, country, values, output):
+        # Draw one country's chart and save it to output (a path or file object)
+        with stage('update_bars', country):
+            for bar, text, value in zip(self.bars, self.value_labels, values):
+                bar.set_width(value)
+                text.set_x(value)
+                text.set_text(f'{value:,.2f}')
+            self.ax.relim()
+            self.ax.autoscale_view()
+        self.title.set_text(self.title_format.format(country=country, year=self.year))
+        if not self.laid_out:
+            # Lay out once around a value label as wide as any realistic value,
+            # so labels at the end of the longest bar are never clipped
+            for text in self.value_labels:
+                text.set_text(f'{8_888_888_888.88:,.2f}')
+            with stage('tight_layout'):
+                self.fig.tight_layout()
+            for text, value in zip(self.value_labels, values):
+                text.set_text(f'{value:,.2f}')
+            self.laid_out = True
+        with stage('savefig', country):
+            self.fig.savefig(output, **self.save_options)
+
+    def close(self):
+        plt.close(self.fig)
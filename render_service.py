@@ -0,0 +1,321 @@
+import argparse
+import asyncio
+import hashlib
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote, urlsplit
+
+from data_loader import SOURCE_FILE, file_digest
+
+# Long-running local render service: the source and reference files are
+# loaded and indexed once per render process, and each request draws a
+# single chart.
+#
+#   GET /country/<area>.png       land cover vs emissions per year (Graph1)
+#   GET /bars/<area>.png          2021 land cover, emissions and population (Graph4)
+#   GET /continents/<year>.png    average land cover and emissions by continent (Graph2)
+#
+# Rendered images are kept in an LRU cache. ETags are derived from the
+# input files and the resolved request (the area as the source spells it),
+# so If-None-Match is answered without rendering, even for images that have
+# left the cache; unknown areas and years are still answered with 404.
+
+ROUTES = ('country', 'bars', 'continents')
+REFERENCE_FILES = ["country-by-continent.json", "country-by-population.json"]
+
+# Code that loads, joins and draws the chart data; editing it changes every
+# ETag
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CODE_FILES = ["data_loader.py", "aggregates.py", "countries.py", "enrichment.py", "scales.py",
+              "render_engine.py", "Graph4.py", "render_service.py"]
+MAX_HEADER_BYTES = 16384
+
+# Per-process render state, filled in by load_state()
+state = None
+
+
+def load_state():
+    # Index everything a request may need, once per render process
+    global state
+    import matplotlib
+    matplotlib.use('Agg')
+
+    from Graph4 import load_plot_data
+    from aggregates import VALUE_COLUMNS
+    from countries import country_key, map_continents, skipped_areas
+    from data_loader import load_data, partition_by_area, snapshot_checks
+    from render_engine import ComparisonChart, HorizontalBarChart
+    from scales import load_scales
+
+    data = load_data()
+    scales = load_scales(data=data)['columns']
+    continents = data.assign(continent=map_continents(data['area']))
+    state = {
+        'country': dict(partition_by_area(data[~data['area'].isin(skipped_areas(snapshot_checks()))])),
+        'bars': dict(partition_by_area(load_plot_data())),
+        'continents': continents.groupby(['year', 'continent'])[VALUE_COLUMNS].mean(),
+        # Normalised names, so "Côte d'Ivoire" finds the source's damaged spelling
+        'areas': {country_key(area): area for area in data['area'].unique()},
+        # Chart templates, with Graph1's global axis limits
+        'comparison_chart': ComparisonChart(scales['land cover']['max'], scales['agricultural emissions']['max']),
+        'bar_chart': HorizontalBarChart(2021),
+    }
+
+
+def render_country(area):
+    country_data = state['country'][area]
+    output = io.BytesIO()
+    state['comparison_chart'].render(area, country_data['year'], country_data['land cover'],
+                                     country_data['agricultural emissions'], output)
+    return output.getvalue()
+
+
+def render_bars(area):
+    row = state['bars'][area].iloc[0]
+    output = io.BytesIO()
+    state['bar_chart'].render(area, [row['land cover'], row['agricultural emissions'], row['population']], output)
+    return output.getvalue()
+
+
+def render_continents(year):
+    # Same layout as Graph2.py, drawn on a fresh figure (the continents and
+    # their number vary by year)
+    import matplotlib.pyplot as plt
+    from scales import format_log_axis
+    averages = state['continents'].loc[year]
+
+    fig, ax1 = plt.subplots(figsize=(10, 6))
+    x_labels = list(averages.index)
+    bar_width = 0.4
+
+    ax1.bar(x_labels, averages['land cover'], width=bar_width, label='Average Land Cover (1000 hectares)', color='blue', align='center')
+    ax1.set_xlabel('Continent', fontsize=12)
+    ax1.set_ylabel('Average Land Cover (1000 hectares, Log Scale)', fontsize=12, color='blue')
+    ax1.set_yscale('log')
+    ax1.tick_params(axis='y', labelcolor='blue')
+    format_log_axis(ax1.yaxis)
+
+    ax2 = ax1.twinx()
+    ax2.bar(x_labels, averages['agricultural emissions'], width=bar_width, label='Average Emissions (kilotons)', color='orange', align='edge')
+    ax2.set_ylabel('Average Emissions (kilotons, Log Scale)', fontsize=12, color='orange')
+    ax2.set_yscale('log')
+    ax2.tick_params(axis='y', labelcolor='orange')
+    format_log_axis(ax2.yaxis)
+
+    ax2.set_title(f'Average Land Cover and Emissions by Continent for {year} (Logarithmic Scale)', fontsize=14)
+    ax1.set_xticks(range(len(x_labels)))
+    ax1.set_xticklabels(x_labels, rotation=45, ha='right')
+    fig.tight_layout()
+
+    output = io.BytesIO()
+    fig.savefig(output)
+    plt.close(fig)
+    return output.getvalue()
+
+
+RENDERERS = {'country': render_country, 'bars': render_bars, 'continents': render_continents}
+
+
+def resolve(route, key):
+    # Runs in a render process; returns the key as the state indexes it, or
+    # None for an unknown area or year
+    if route == 'continents':
+        return key if key in state['continents'].index.get_level_values('year') else None
+    if key not in state[route]:
+        from countries import country_key
+        key = state['areas'].get(country_key(key))
+    return key if key in state[route] else None
+
+
+def render(route, key):
+    # Runs in a render process; returns PNG bytes, or None for an unknown key
+    key = resolve(route, key)
+    if key is None:
+        return None
+    return RENDERERS[route](key)
+
+
+def ready():
+    # Submitted once per render process at startup, so the data is loaded
+    # before the first request arrives
+    return state is not None
+
+
+class LRUCache:
+    # Least recently used entries, e.g. rendered images: {(route, key): (etag, png)}
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def get(self, request):
+        entry = self.entries.get(request)
+        if entry is not None:
+            self.entries.move_to_end(request)
+        return entry
+
+    def put(self, request, entry):
+        self.entries[request] = entry
+        self.entries.move_to_end(request)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class RenderService:
+    def __init__(self, pool, cache_size):
+        self.pool = pool
+        self.cache = LRUCache(cache_size)
+        # Requests as received -> requests with their key resolved
+        self.resolved = LRUCache(cache_size)
+        self.pending = {}
+        # Any change to the data, the reference files or the drawing code
+        # yields new ETags
+        digest = hashlib.sha256()
+        for path in [SOURCE_FILE] + REFERENCE_FILES + [os.path.join(SCRIPT_DIR, name) for name in CODE_FILES]:
+            digest.update(file_digest(path).encode('ascii'))
+        self.version = digest.hexdigest()
+
+    def etag(self, request):
+        return '"' + hashlib.sha256(repr((self.version,) + request).encode('utf-8')).hexdigest()[:32] + '"'
+
+    async def resolve(self, request):
+        # The request with its key resolved by a render process, or None for
+        # an unknown area or year
+        resolved = self.resolved.get(request)
+        if resolved is None:
+            loop = asyncio.get_running_loop()
+            key = await loop.run_in_executor(self.pool, resolve, *request)
+            if key is None:
+                return None
+            resolved = (request[0], key)
+            self.resolved.put(request, resolved)
+        return resolved
+
+    async def image(self, request):
+        # (etag, png) for a request, rendering it at most once even when the
+        # same chart is requested concurrently; None for an unknown key
+        entry = self.cache.get(request)
+        if entry is not None:
+            return entry
+        if request not in self.pending:
+            loop = asyncio.get_running_loop()
+            self.pending[request] = loop.run_in_executor(self.pool, render, *request)
+        try:
+            # Shielded so a client hanging up does not cancel the render for
+            # other requests waiting on it
+            png = await asyncio.shield(self.pending[request])
+        finally:
+            self.pending.pop(request, None)
+        if png is None:
+            return None
+        entry = (self.etag(request), png)
+        self.cache.put(request, entry)
+        return entry
+
+    async def respond(self, method, target, headers):
+        # (status, extra headers, body) for one request
+        if method not in ('GET', 'HEAD'):
+            return 405, {'Allow': 'GET, HEAD'}, b'Method not allowed\n'
+        request = parse_target(target)
+        if request is not None:
+            request = await self.resolve(request)
+        if request is None:
+            return 404, {}, b'Not found\n'
+
+        # Conditional requests for a known chart are answered from the ETag alone
+        etag = self.etag(request)
+        if etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            return 304, {'ETag': etag, 'Cache-Control': 'no-cache'}, b''
+
+        entry = await self.image(request)
+        if entry is None:
+            return 404, {}, b'Not found\n'
+        etag, png = entry
+        return 200, {'ETag': etag, 'Cache-Control': 'no-cache', 'Content-Type': 'image/png'}, png
+
+    async def handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ')
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                try:
+                    status, extra, body = await self.respond(method, target, headers)
+                except Exception as error:
+                    # A failed render is reported to the client rather than
+                    # dropping the connection
+                    print(f"{method} {target} failed: {error!r}")
+                    status, extra, body = 500, {}, b'Internal server error\n'
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                response = [f"HTTP/1.1 {status} {STATUS_TEXT[status]}",
+                            f"Content-Length: {len(body)}",
+                            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                response += [f"{name}: {value}" for name, value in extra.items()]
+                writer.write(('\r\n'.join(response) + '\r\n\r\n').encode('latin1'))
+                if method != 'HEAD':
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+
+STATUS_TEXT = {200: 'OK', 304: 'Not Modified', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error'}
+
+
+def parse_target(target):
+    # "/country/Albania.png" -> ('country', 'Albania'); "/continents/2021.png"
+    # -> ('continents', 2021); None for anything else
+    parts = urlsplit(target).path.split('/')
+    if len(parts) != 3 or parts[0] != '' or parts[1] not in ROUTES or not parts[2].endswith('.png'):
+        return None
+    key = unquote(parts[2][:-len('.png')])
+    if parts[1] == 'continents':
+        if not key.isdigit():
+            return None
+        key = int(key)
+    return parts[1], key
+
+
+async def serve(host, port, workers, cache_size):
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_state) as pool:
+        service = RenderService(pool, cache_size)
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(pool, ready) for _ in range(workers)))
+        server = await asyncio.start_server(service.handle, host, port, limit=MAX_HEADER_BYTES)
+        print(f"Serving charts on http://{host}:{port}/ with {workers} render process(es)")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve single charts over HTTP, keeping the data loaded between requests.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument('--workers', type=int, default=1, help="number of render processes (default: 1)")
+    parser.add_argument('--cache-size', type=int, default=256, help="rendered images kept in memory (default: 256)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.cache_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+import json
+import math
+import os
+
+import numpy as np
+
+from aggregates import VALUE_COLUMNS
+from countries import CONTINENT_FILE
+from data_loader import CACHE_DIR, SOURCE_FILE, load_data, snapshot_digest
+from enrichment import POPULATION_FILE, cache_key, load_enriched
+from instrumentation import stage
+
+# Axis scales shared by every chart: per numeric column the global minimum,
+# maximum and smallest positive value, decade ticks with their labels, and
+# per-area [smallest positive, maximum] ranges. They are computed once per
+# dataset version and stored as scales.json in the table's snapshot
+# directory, so every generator draws the same axes without reducing the
+# full columns again.
+SCALES_FILE = "scales.json"
+SCALES_VERSION = 1
+
+
+def format_tick(value):
+    # 1000 -> "1k", 2.5e6 -> "2.5M", 0.01 -> "0.01"
+    for factor, suffix in ((1e9, 'B'), (1e6, 'M'), (1e3, 'k')):
+        if abs(value) >= factor:
+            return f"{value / factor:g}{suffix}"
+    return f"{value:g}"
+
+
+def log_ticks(lower, upper):
+    # Decade ticks within [lower, upper] and their labels
+    first = math.ceil(math.log10(lower) - 1e-9)
+    last = math.floor(math.log10(upper) + 1e-9)
+    values = [10.0 ** exponent for exponent in range(first, last + 1)]
+    return values, [format_tick(value) for value in values]
+
+
+def decade_range(lower, upper):
+    # [lower, upper] widened to whole decades (at least one), as log10
+    # exponents (Plotly log-axis ranges are given in exponents)
+    first = math.floor(math.log10(lower))
+    return [first, max(math.ceil(math.log10(upper)), first + 1)]
+
+
+def log_limits(scale, below_one=False):
+    # (lower, upper) log-axis limits for a column: from 1, or with below_one
+    # from a decade under its smallest positive value when that is below 1
+    lower = 1
+    if below_one and scale['positive_min']:
+        lower = min(1, 10 ** math.floor(math.log10(scale['positive_min'])))
+    return lower, scale['max']
+
+
+def _number(value):
+    return None if value is None or np.isnan(value) else float(value)
+
+
+def compute_scales(data, columns, slice_key='area'):
+    # {"columns": {column: {"min", "max", "positive_min", "ticks", "labels"}},
+    #  slice_key: {slice: {column: [positive_min, max]}}}
+    # in one reduction per column and one grouped pass for the slices
+    with stage('scales'):
+        frame = data[list(columns)]
+        positive = frame.where(frame > 0)
+        minima, maxima, positive_minima = frame.min(), frame.max(), positive.min()
+        scales = {'columns': {}}
+        for column in columns:
+            scale = {'min': _number(minima[column]), 'max': _number(maxima[column]),
+                     'positive_min': _number(positive_minima[column])}
+            if scale['positive_min'] is not None:
+                lower, upper = decade_range(scale['positive_min'], scale['max'])
+                scale['ticks'], scale['labels'] = log_ticks(10.0 ** lower, 10.0 ** upper)
+            else:
+                scale['ticks'], scale['labels'] = [], []
+            scales['columns'][column] = scale
+
+        grouped = positive.groupby(data[slice_key], sort=False).agg(['min', 'max'])
+        slices = {}
+        for column in columns:
+            low = grouped[(column, 'min')].tolist()
+            high = grouped[(column, 'max')].tolist()
+            for name, lower, upper in zip(grouped.index, low, high):
+                slices.setdefault(str(name), {})[column] = [_number(lower), _number(upper)]
+        scales[slice_key] = slices
+    return scales
+
+
+def combined_ticks(scales, columns=VALUE_COLUMNS):
+    # (tick values, labels) covering several columns on one shared axis
+    ticks = sorted({tick for column in columns for tick in scales['columns'][column]['ticks']})
+    return ticks, [format_tick(tick) for tick in ticks]
+
+
+def log_axis(scales, columns=VALUE_COLUMNS, slice_key='area'):
+    # JSON-ready settings for a Plotly log axis shared by several columns:
+    #   {"tickvals": [...], "ticktext": [...], "ranges": {slice: [lower, upper]}}
+    # the global decade ticks, and per slice the decade range covering its
+    # positive values (slices without any are left to autorange)
+    tickvals, ticktext = combined_ticks(scales, columns)
+    ranges = {}
+    for name, slice_scales in scales[slice_key].items():
+        lows = [slice_scales[column][0] for column in columns if slice_scales[column][0] is not None]
+        highs = [slice_scales[column][1] for column in columns if slice_scales[column][1] is not None]
+        if lows:
+            ranges[name] = decade_range(min(lows), max(highs))
+    return {'tickvals': tickvals, 'ticktext': ticktext, 'ranges': ranges}
+
+
+def load_scales(enriched=False, data=None, file_name=SOURCE_FILE, cache_dir=CACHE_DIR):
+    # Scales of the source's value columns, or with enriched=True of every
+    # numeric column of the enriched table (see enrichment.py), served from
+    # the snapshot directory until the dataset changes. data is the table
+    # when the caller has already loaded it.
+    if enriched:
+        if data is None:
+            data = load_enriched(file_name, cache_dir=cache_dir)
+        key = cache_key(file_name, CONTINENT_FILE, POPULATION_FILE, cache_dir)
+        columns = [column for column in data.select_dtypes('number').columns if column != 'year']
+        suffix = '.enriched'
+    else:
+        if data is None:
+            data = load_data(file_name, cache_dir)
+        key = {'source_sha256': snapshot_digest(file_name, cache_dir)}
+        columns = VALUE_COLUMNS
+        suffix = ''
+    key = dict(key, scales_version=SCALES_VERSION)
+    snapshot_dir = os.path.join(cache_dir, os.path.basename(os.path.abspath(file_name)).replace(' ', '_') + suffix)
+    path = os.path.join(snapshot_dir, SCALES_FILE)
+
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached['key'] == json.loads(json.dumps(key)):
+            return cached['scales']
+
+    scales = compute_scales(data, columns)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'key': key, 'scales': scales}, f, ensure_ascii=False)
+    return scales
+
+
+def format_log_axis(axis):
+    # Label a matplotlib log axis's major ticks like the Plotly pages
+    from matplotlib.ticker import FuncFormatter
+    axis.set_major_formatter(FuncFormatter(lambda value, position: format_tick(value)))
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import instrumentation
+from aggregates import (VALUE_COLUMNS, AreaChecks, OrderedUnique, RowChecks, RunningGroupSum, RunningMax, consume,
+                        consume_by_year, continent_cube, cube_from_sums, lod_tiers)
+
+
+@pytest.fixture
+def data():
+    # Three years, with Oceania absent from 2001
+    rng = np.random.default_rng(0)
+    rows = [(year, area, continent) for year in (2000, 2001, 2002)
+            for area, continent in (('Chad', 'Africa'), ('Niger', 'Africa'), ('Nepal', 'Asia'), ('Fiji', 'Oceania'))
+            if not (year == 2001 and continent == 'Oceania')]
+    frame = pd.DataFrame(rows, columns=['year', 'area', 'continent'])
+    for column in VALUE_COLUMNS:
+        frame[column] = rng.uniform(0, 1000, len(frame)).round(2)
+    return frame
+
+
+def chunks(frame, size=3):
+    return [frame.iloc[start:start + size] for start in range(0, len(frame), size)]
+
+
+def test_continent_cube_matches_a_groupby(data):
+    cube = continent_cube(data)
+    grouped = data.groupby(['year', 'continent'])
+    sums, counts, means = grouped[VALUE_COLUMNS].sum(), grouped.size(), grouped[VALUE_COLUMNS].mean()
+
+    assert cube['years'] == [2000, 2001, 2002]
+    assert cube['continents'] == ['Africa', 'Asia', 'Oceania']
+    for i, year in enumerate(cube['years']):
+        for j, continent in enumerate(cube['continents']):
+            if (year, continent) not in counts.index:
+                assert cube['count'][i][j] == 0
+                assert all(cube[stat][column][i][j] is None for stat in ('sum', 'mean') for column in VALUE_COLUMNS)
+                continue
+            assert cube['count'][i][j] == counts[(year, continent)]
+            for column in VALUE_COLUMNS:
+                assert cube['sum'][column][i][j] == pytest.approx(sums.loc[(year, continent), column])
+                assert cube['mean'][column][i][j] == pytest.approx(means.loc[(year, continent), column])
+
+
+def test_streamed_sums_build_the_same_cube(data):
+    totals = RunningGroupSum(['year', 'continent'], VALUE_COLUMNS)
+    consume(chunks(data), totals)
+    streamed = cube_from_sums(*totals.result())
+    whole = continent_cube(data)
+
+    assert streamed['years'] == whole['years'] and streamed['continents'] == whole['continents']
+    assert streamed['count'] == whole['count']
+    for stat in ('sum', 'mean'):
+        for column in VALUE_COLUMNS:
+            np.testing.assert_allclose(np.array(streamed[stat][column], dtype=float),
+                                       np.array(whole[stat][column], dtype=float))
+
+
+def test_consuming_by_year_gives_the_same_sums(data, monkeypatch):
+    plain = RunningGroupSum(['year', 'continent'], VALUE_COLUMNS)
+    consume([data], plain)
+    # Per-year accumulation only happens while instrumentation is on
+    monkeypatch.setattr(instrumentation, 'recording', True)
+    by_year = RunningGroupSum(['year', 'continent'], VALUE_COLUMNS)
+    consume_by_year([data], by_year)
+    instrumentation.take_events()
+
+    pd.testing.assert_frame_equal(by_year.result()[0], plain.result()[0])
+    assert by_year.result()[1].tolist() == plain.result()[1].tolist()
+
+
+def test_running_max_and_ordered_unique(data):
+    maxima = RunningMax(VALUE_COLUMNS)
+    areas = OrderedUnique('area')
+    consume(chunks(data), maxima, areas)
+    assert maxima.result() == {column: data[column].max() for column in VALUE_COLUMNS}
+    assert areas.result() == ['Chad', 'Niger', 'Nepal', 'Fiji']
+
+
+def test_row_checks_find_repeated_keys_across_chunks():
+    raw = pd.DataFrame({'year': ['2000', '2000', 'n.d.', '2001'], 'area': ['Chad', 'Niger', 'Chad', 'Chad'],
+                        'land cover': [1.0, np.nan, 2.0, -3.0], 'agricultural emissions': [1.0, 2.0, 3.0, 4.0]})
+    checks = RowChecks(VALUE_COLUMNS)
+    consume([raw.iloc[:2], raw.iloc[2:], raw.iloc[:1]], checks)
+    result = checks.result()
+
+    assert result['rows'] == 5
+    assert result['invalid_years'] == [[2, 'n.d.']]
+    assert result['missing']['land cover'] == [[2000, 'Niger']]
+    assert result['negative']['land cover'] == [[2001, 'Chad', -3.0]]
+    assert result['duplicates'] == [[2000, 'Chad', 2]]
+
+
+def test_area_checks_find_sums_of_parts_and_outliers():
+    years = list(range(2000, 2006))
+    frame = pd.DataFrame({
+        'year': years * 3,
+        'area': ['Sudan'] * 6 + ['Sudan, north'] * 6 + ['Sudan, south'] * 6,
+        'land cover': [30.0] * 6 + [10.0] * 6 + [20.0] * 6,
+        # One value three decades above the area's usual level
+        'agricultural emissions': [3.0] * 6 + [1.0] * 5 + [1000.0] + [2.0] * 6,
+    })
+    checks = AreaChecks(['land cover'], decades=1.0, min_values=5)
+    checks.update(frame)
+    result = checks.result()
+    assert result['sums_of_parts'] == [{'area': 'Sudan', 'parts': ['Sudan, north', 'Sudan, south'],
+                                        'matches_parts': True}]
+    assert result['outliers'] == []
+
+    checks = AreaChecks(['agricultural emissions'], decades=1.0, min_values=5)
+    checks.update(frame)
+    result = checks.result()
+    # One revised year does not stop the parts matching (median difference)
+    assert result['sums_of_parts'][0]['matches_parts'] is True
+    assert result['outliers'] == [{'year': 2005, 'area': 'Sudan, north', 'column': 'agricultural emissions',
+                                   'value': 1000.0, 'area_median': 1.0}]
+
+
+def test_lod_tiers_bucket_means_and_envelopes():
+    frame = pd.DataFrame({'year': [1998, 1999, 2000, 2001, 2004, 2005], 'area': ['Chad'] * 6,
+                          'land cover': [1.0, 3.0, 5.0, 7.0, 9.0, 11.0],
+                          'agricultural emissions': [2.0] * 6})
+    tier = lod_tiers(frame, widths=[5])['Chad']['5']
+    assert tier['year'] == [1998, 2000, 2005]
+    assert tier['end'] == [1999, 2004, 2005]
+    assert tier['land cover'] == [2.0, 7.0, 11.0]
+    assert tier['land cover min'] == [1.0, 5.0, 11.0]
+    assert tier['land cover max'] == [3.0, 9.0, 11.0]
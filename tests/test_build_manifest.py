@@ -0,0 +1,73 @@
+import importlib
+import sys
+
+import pandas as pd
+import pytest
+
+from build_manifest import BuildManifest
+
+STYLE = '''
+def draw(country, data):
+    return "{colour}"
+'''
+
+
+@pytest.fixture
+def style(tmp_path, monkeypatch):
+    # A drawing module whose source the tests can edit
+    path = tmp_path / 'chart_style.py'
+    path.write_text(STYLE.format(colour='blue'), encoding='utf-8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module('chart_style')
+    yield path, module
+    sys.modules.pop('chart_style', None)
+
+
+def jobs(land_cover=1.0):
+    return [('Chad', pd.DataFrame({'year': [2000, 2001], 'land cover': [land_cover, 2.0]})),
+            ('Niger', pd.DataFrame({'year': [2000, 2001], 'land cover': [3.0, 4.0]}))]
+
+
+def build(output_dir, jobs, sources, params, force=False):
+    # One run of a graph script: render the stale charts, then save the manifest
+    manifest = BuildManifest(str(output_dir))
+    stale = manifest.stale_jobs(jobs, sources, lambda area: str(output_dir / f"{area}.png"), params, force)
+    for area, data in stale:
+        (output_dir / f"{area}.png").write_bytes(b'png')
+    manifest.save()
+    return [area for area, data in stale]
+
+
+def test_unchanged_charts_are_skipped(tmp_path, style):
+    path, module = style
+    assert build(tmp_path, jobs(), [module.draw], {'max': 10}) == ['Chad', 'Niger']
+    assert build(tmp_path, jobs(), [module.draw], {'max': 10}) == []
+    assert build(tmp_path, jobs(), [module.draw], {'max': 10}, force=True) == ['Chad', 'Niger']
+
+
+def test_changed_data_invalidates_only_its_chart(tmp_path, style):
+    path, module = style
+    build(tmp_path, jobs(), [module.draw], {'max': 10})
+    assert build(tmp_path, jobs(land_cover=1.5), [module.draw], {'max': 10}) == ['Chad']
+
+
+def test_changed_params_invalidate_every_chart(tmp_path, style):
+    path, module = style
+    build(tmp_path, jobs(), [module.draw], {'max': 10})
+    assert build(tmp_path, jobs(), [module.draw], {'max': 20}) == ['Chad', 'Niger']
+
+
+def test_changed_source_code_invalidates_every_chart(tmp_path, style):
+    path, module = style
+    build(tmp_path, jobs(), [module.draw], {'max': 10})
+
+    path.write_text(STYLE.format(colour='red'), encoding='utf-8')
+    module = importlib.reload(module)
+    assert build(tmp_path, jobs(), [module.draw], {'max': 10}) == ['Chad', 'Niger']
+
+
+def test_missing_output_is_rendered_again(tmp_path, style):
+    path, module = style
+    build(tmp_path, jobs(), [module.draw], {'max': 10})
+    (tmp_path / 'Niger.png').unlink()
+    assert build(tmp_path, jobs(), [module.draw], {'max': 10}) == ['Niger']
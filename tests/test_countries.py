@@ -0,0 +1,118 @@
+import json
+
+import pytest
+
+import countries
+from countries import CountryIndex, country_key, resolve_continents, resolve_populations, resolve_reference
+
+REFERENCE = [
+    {'country': 'China', 'continent': 'Asia', 'population': 1392730000},
+    {'country': 'Montenegro', 'continent': 'Europe', 'population': 631219},
+    {'country': 'Luxembourg', 'continent': 'Europe', 'population': 607950},
+    {'country': 'Niger', 'continent': 'Africa', 'population': 22442948},
+    {'country': 'Guinea', 'continent': 'Africa', 'population': 12414318},
+    {'country': 'Papua New Guinea', 'continent': 'Oceania', 'population': 8606316},
+    {'country': 'Ivory Coast', 'continent': 'Africa', 'population': 25069229},
+]
+
+# Areas that name several countries, or another country's part, must not
+# take a population from the reference
+MULTI_COUNTRY = ["Serbia and Montenegro", "Belgium-Luxembourg", "China, Taiwan Province of"]
+
+
+def write_reference(path, entries=REFERENCE):
+    path.write_text(json.dumps(entries), encoding='utf-8')
+    return str(path)
+
+
+def index(substrings=True):
+    return CountryIndex({country_key(entry['country']): (entry['country'], entry['continent'])
+                         for entry in REFERENCE}, substrings)
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    # Count the reference files read to resolve new areas
+    calls = []
+    load_reference = countries.load_reference
+
+    def counting(path, field):
+        calls.append(field)
+        return load_reference(path, field)
+
+    monkeypatch.setattr(countries, 'load_reference', counting)
+    return calls
+
+
+def test_country_key_normalises_case_punctuation_and_damaged_letters():
+    assert country_key("Côte d'Ivoire") == country_key("Cï¿½te d'Ivoire") == 'cte divoire'
+    assert country_key("Papua  New-Guinea") == 'papua new guinea'
+
+
+def test_exact_key_and_alias():
+    assert index().match('CHINA') == 'china'
+    assert index().match("Côte d'Ivoire") == 'ivory coast'
+
+
+def test_longest_whole_word_match():
+    assert index().match('Republic of the Niger') == 'niger'
+    # The longer of two contained names wins
+    assert index().match('Independent State of Papua New Guinea') == 'papua new guinea'
+    # Names only match as whole words
+    assert index().match('Nigeria') is None
+
+
+def test_longest_match_overlapping_an_earlier_shorter_one():
+    # "saint kitts" starts first, but the longer overlapping name wins
+    overlapping = CountryIndex({'saint kitts': ('Saint Kitts', 'North America'),
+                                'kitts and nevis': ('Kitts and Nevis', 'North America')})
+    assert overlapping.match('Federation of Saint Kitts and Nevis') == 'kitts and nevis'
+
+
+def test_exact_mode_skips_the_substring_fallback():
+    assert index(substrings=False).match('Republic of the Niger') is None
+    assert index(substrings=False).exact_match("Côte d'Ivoire") == 'ivory coast'
+    for area in MULTI_COUNTRY:
+        assert index(substrings=False).match(area) is None
+
+
+def test_multi_country_areas_get_no_population(tmp_path):
+    reference = write_reference(tmp_path / 'reference.json')
+    populations = resolve_populations(MULTI_COUNTRY + ['China'], reference, str(tmp_path))
+    assert populations == {'China': 1392730000, **dict.fromkeys(MULTI_COUNTRY)}
+
+
+def test_continents_use_the_fallback_and_skip_aggregates(tmp_path):
+    reference = write_reference(tmp_path / 'reference.json')
+    continents = resolve_continents(['China, Taiwan Province of', 'Nigeria', 'China'], reference, str(tmp_path))
+    assert continents == {'China, Taiwan Province of': 'Asia', 'Nigeria': countries.UNKNOWN, 'China': None}
+
+
+def test_lookup_table_is_reused(tmp_path, loads):
+    reference = write_reference(tmp_path / 'reference.json')
+    first = resolve_reference(['China', 'Montenegro'], reference, 'continent', 'Unknown', str(tmp_path))
+    second = resolve_reference(['Montenegro', 'China'], reference, 'continent', 'Unknown', str(tmp_path))
+    assert first == second == {'China': 'Asia', 'Montenegro': 'Europe'}
+    assert len(loads) == 1
+    # Only areas not seen before are resolved
+    resolve_reference(['Niger'], reference, 'continent', 'Unknown', str(tmp_path))
+    assert len(loads) == 2
+
+
+def test_lookup_table_is_rebuilt_when_the_reference_changes(tmp_path, loads):
+    path = tmp_path / 'reference.json'
+    reference = write_reference(path)
+    resolve_reference(['China'], reference, 'continent', 'Unknown', str(tmp_path))
+
+    write_reference(path, [dict(REFERENCE[0], continent='Eurasia')] + REFERENCE[1:])
+    assert resolve_reference(['China'], reference, 'continent', 'Unknown', str(tmp_path)) == {'China': 'Eurasia'}
+    assert len(loads) == 2
+
+
+def test_lookup_table_is_rebuilt_when_the_aliases_change(tmp_path, loads, monkeypatch):
+    reference = write_reference(tmp_path / 'reference.json')
+    assert resolve_reference(['Cathay'], reference, 'continent', 'Unknown', str(tmp_path)) == {'Cathay': 'Unknown'}
+
+    monkeypatch.setitem(countries.ALIASES, 'Cathay', 'China')
+    assert resolve_reference(['Cathay'], reference, 'continent', 'Unknown', str(tmp_path)) == {'Cathay': 'Asia'}
+    assert len(loads) == 2
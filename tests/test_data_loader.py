@@ -0,0 +1,200 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_loader
+from data_loader import load_data, read_filtered, read_snapshot, stream_data, write_snapshot
+
+ROWS = [
+    '1992.00,"Afghanistan",1608715.50,20408.17',
+    '1993.00,"Afghanistan",1610000.25,',
+    '1992.00,"Albania",103336.56,20128.14',
+]
+
+
+def write_source(path, rows=ROWS):
+    path.write_text('\n'.join(rows) + '\n', encoding='latin1')
+    return str(path)
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    # Count the full parses behind load_data()
+    calls = []
+    parse_source = data_loader.parse_source
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return parse_source(*args, **kwargs)
+
+    monkeypatch.setattr(data_loader, 'parse_source', counting)
+    return calls
+
+
+def test_snapshot_round_trip(tmp_path):
+    frame = pd.DataFrame({
+        'year': np.array([1992, 1993, 1992], dtype=np.int32),
+        'area': ['Afghanistan', 'Afghanistan', 'Albania'],
+        'continent': ['Asia', None, 'Europe'],
+        'land cover': [1.5, 2.25, 0.0],
+    })
+    write_snapshot(frame, str(tmp_path), {'sha256': 'x'})
+    meta, loaded = read_snapshot(str(tmp_path))
+
+    assert meta['rows'] == 3 and meta['sha256'] == 'x'
+    assert loaded['year'].dtype == np.int32
+    assert loaded['year'].tolist() == [1992, 1993, 1992]
+    assert loaded['land cover'].tolist() == [1.5, 2.25, 0.0]
+    assert loaded['area'].tolist() == ['Afghanistan', 'Afghanistan', 'Albania']
+    # A missing string is stored as code -1 and must not come back as a label
+    assert loaded['continent'].isna().tolist() == [False, True, False]
+    assert loaded['continent'].dropna().tolist() == ['Asia', 'Europe']
+
+
+def test_half_written_snapshot_is_ignored(tmp_path):
+    write_snapshot(pd.DataFrame({'year': [1992]}), str(tmp_path), {})
+    os.remove(tmp_path / 'meta.json')
+    assert read_snapshot(str(tmp_path)) == (None, None)
+
+
+def test_rewriting_a_snapshot_keeps_earlier_reads_valid(tmp_path):
+    # Run in a child process: a column file truncated under a live memory
+    # map kills the process with SIGBUS rather than raising
+    script = textwrap.dedent('''
+        import sys
+        import numpy as np
+        import pandas as pd
+        from data_loader import read_snapshot, write_snapshot
+
+        snapshot_dir = sys.argv[1]
+        write_snapshot(pd.DataFrame({'x': np.arange(1_000_000, dtype=np.float64)}), snapshot_dir, {})
+        _, frame = read_snapshot(snapshot_dir)
+        write_snapshot(pd.DataFrame({'x': np.arange(10, dtype=np.float64)}), snapshot_dir, {})
+        print(frame['x'].sum(), read_snapshot(snapshot_dir)[1]['x'].sum())
+    ''')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', script, str(tmp_path)], cwd=root,
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == [str(float(sum(range(1_000_000)))), '45.0']
+    # Only the current generation's columns are left behind
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.npy')] == \
+        list(json.loads((tmp_path / 'meta.json').read_text())['files'].values())
+
+
+def test_snapshot_of_another_version_is_ignored(tmp_path):
+    write_snapshot(pd.DataFrame({'year': [1992]}), str(tmp_path), {})
+    meta_path = tmp_path / 'meta.json'
+    meta = json.loads(meta_path.read_text())
+    meta_path.write_text(json.dumps(dict(meta, version=meta['version'] - 1)))
+    assert read_snapshot(str(tmp_path)) == (None, None)
+
+
+def test_load_data_cleans_and_reuses_the_snapshot(tmp_path, parses):
+    source = write_source(tmp_path / 'source.txt')
+    cache = str(tmp_path / 'cache')
+
+    first = load_data(source, cache)
+    assert first['year'].tolist() == [1992, 1993, 1992]
+    assert first['agricultural emissions'].tolist() == [20408.17, 0.0, 20128.14]
+    second = load_data(source, cache)
+    assert len(parses) == 1
+    assert second.to_dict('list') == first.to_dict('list')
+
+
+def test_load_data_rebuilds_when_the_size_changes(tmp_path, parses):
+    path = tmp_path / 'source.txt'
+    source = write_source(path)
+    cache = str(tmp_path / 'cache')
+    load_data(source, cache)
+
+    write_source(path, ROWS + ['1993.00,"Albania",103000.00,20000.00'])
+    assert len(load_data(source, cache)) == 4
+    assert len(parses) == 2
+
+
+def test_load_data_trusts_a_touched_file_with_the_same_hash(tmp_path, parses):
+    source = write_source(tmp_path / 'source.txt')
+    cache = str(tmp_path / 'cache')
+    load_data(source, cache)
+
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    load_data(source, cache)
+    assert len(parses) == 1
+    # The new mtime is recorded, so the next load skips hashing
+    with open(os.path.join(cache, 'source.txt', 'meta.json'), encoding='utf-8') as f:
+        assert json.load(f)['mtime_ns'] == stat.st_mtime_ns + 10**9
+
+
+def test_load_data_rebuilds_when_the_hash_changes(tmp_path, parses):
+    path = tmp_path / 'source.txt'
+    source = write_source(path)
+    cache = str(tmp_path / 'cache')
+    load_data(source, cache)
+
+    # Same size, new mtime and contents
+    stat = os.stat(source)
+    write_source(path, [ROWS[0].replace('1608715.50', '1608715.51')] + ROWS[1:])
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert os.stat(source).st_size == stat.st_size
+    assert load_data(source, cache)['land cover'].iloc[0] == 1608715.51
+    assert len(parses) == 2
+
+
+def test_rows_without_a_year_are_dropped_and_reported(tmp_path):
+    source = write_source(tmp_path / 'source.txt', ROWS + ['unknown,"Albania",1.00,2.00'])
+    cache = str(tmp_path / 'cache')
+
+    assert load_data(source, cache)['year'].tolist() == [1992, 1993, 1992]
+    checks = data_loader.snapshot_checks(source, cache)
+    assert checks['invalid_years'] == [[3, 'unknown']]
+    assert checks['missing']['agricultural emissions'] == [[1993, 'Afghanistan']]
+
+
+def test_sums_of_parts_are_found_while_loading(tmp_path):
+    from countries import skipped_areas
+
+    source = write_source(tmp_path / 'source.txt', ROWS + [
+        '1992.00,"Albania, North",100000.00,20000.00',
+        '1992.00,"Albania, South",3336.56,128.14',
+    ])
+    cache = str(tmp_path / 'cache')
+    load_data(source, cache)
+
+    checks = data_loader.snapshot_checks(source, cache)
+    assert checks['sums_of_parts'] == [{'area': 'Albania', 'parts': ['Albania, North', 'Albania, South'],
+                                        'matches_parts': True}]
+    assert 'Albania' in skipped_areas(checks) and 'China' in skipped_areas(checks)
+    assert 'Albania, North' not in skipped_areas(checks)
+
+
+@pytest.mark.parametrize('filters', [{}, {'year': 1992}, {'min_year': 1993}, {'areas': {'Albania'}}])
+def test_streaming_and_snapshot_loads_agree(tmp_path, filters):
+    rows = ROWS + ['1993.00,"Albania",103000.00,20000.00', 'unknown,"Albania",1.00,2.00',
+                   '1994.00,"Algeria",41000.25,']
+    source = write_source(tmp_path / 'source.txt', rows)
+    data = load_data(source, str(tmp_path / 'cache'))
+    if 'year' in filters:
+        data = data[data['year'] == filters['year']]
+    if 'min_year' in filters:
+        data = data[data['year'] >= filters['min_year']]
+    if 'areas' in filters:
+        data = data[data['area'].isin(filters['areas'])]
+
+    # Chunks of two rows, so filters and cleaning cross chunk boundaries
+    streamed = read_filtered(source, chunksize=2, **filters)
+    assert streamed.dtypes.to_dict() == data.dtypes.to_dict()
+    assert streamed.to_dict('list') == data.reset_index(drop=True).to_dict('list')
+
+
+def test_stream_reads_only_the_requested_columns(tmp_path):
+    source = write_source(tmp_path / 'source.txt')
+    chunks = list(stream_data(source, chunksize=2, usecols=['area', 'land cover']))
+    assert [list(chunk.columns) for chunk in chunks] == [['year', 'area', 'land cover']] * 2
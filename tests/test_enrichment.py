@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from enrichment import CUMULATIVE_EMISSIONS, add_trends, growth_column, rolling_column
+
+
+def frame(rows):
+    # rows of (area, year, land cover, agricultural emissions)
+    data = pd.DataFrame(rows, columns=['area', 'year', 'land cover', 'agricultural emissions'])
+    data['year'] = data['year'].astype(np.int32)
+    return data
+
+
+def test_rolling_mean_covers_years_not_rows():
+    data = frame([
+        ('Chad', 2000, 1.0, 10.0),
+        ('Chad', 2001, 2.0, 20.0),
+        ('Chad', 2005, 3.0, 30.0),
+        ('Chad', 2006, 4.0, 40.0),
+        ('Chad', 2007, 5.0, 50.0),
+    ])
+    trends = add_trends(data, 'area')
+
+    # 2005 averages 2001-2005 (2.0 and 3.0), not the last five rows;
+    # 2007 averages 2003-2007 (3.0, 4.0 and 5.0)
+    assert trends[rolling_column('land cover')].tolist() == [1.0, 1.5, 2.5, 3.5, 4.0]
+    # Growth is only defined from the previous year
+    assert trends[growth_column('land cover')].isna().tolist() == [True, False, True, False, False]
+    assert trends[CUMULATIVE_EMISSIONS].tolist() == [10.0, 30.0, 60.0, 100.0, 150.0]
+
+
+def test_trends_stay_within_their_key():
+    data = frame([
+        ('Niger', 2001, 10.0, 1.0),
+        ('Chad', 2000, 1.0, 2.0),
+        ('Niger', 2000, 20.0, 3.0),
+        ('Chad', 2001, 3.0, 4.0),
+    ])
+    trends = add_trends(data, 'area')
+
+    # Rows keep their order; each area's trends start afresh
+    assert trends['area'].tolist() == ['Niger', 'Chad', 'Niger', 'Chad']
+    assert trends[rolling_column('land cover')].tolist() == [15.0, 1.0, 20.0, 2.0]
+    assert trends[growth_column('land cover')].tolist()[0] == -0.5
+    assert trends[CUMULATIVE_EMISSIONS].tolist() == [4.0, 2.0, 3.0, 6.0]
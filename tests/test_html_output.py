@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+from data_loader import COLUMNS, NUMERIC_COLUMNS, SOURCE_FILE, load_data
+from html_output import INT32_MAX, MAX_ERROR, decode_columns, encode_columns
+
+SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), SOURCE_FILE)
+
+
+@pytest.fixture(scope='module')
+def source_columns(tmp_path_factory):
+    data = load_data(SOURCE, str(tmp_path_factory.mktemp('cache')))
+    return {column: data[column].to_numpy() for column in COLUMNS if column != 'area'}
+
+
+@pytest.mark.parametrize('compression', ['none', 'gzip'])
+def test_real_columns_are_typed_and_exact_as_integers(source_columns, compression):
+    blob = encode_columns(source_columns, 'int32', compression)
+    assert blob['plain'] == {}
+    types = {entry['name']: entry['type'] for entry in blob['columns']}
+    assert types['year'] == 'int32'
+    decoded = decode_columns(blob)
+    for column, values in source_columns.items():
+        assert decoded[column].tolist() == values.tolist()
+
+
+def test_real_columns_are_typed_as_floats(source_columns):
+    blob = encode_columns(source_columns, 'float32')
+    assert blob['plain'] == {}
+    decoded = decode_columns(blob)
+    for column in NUMERIC_COLUMNS:
+        assert np.abs(decoded[column] - source_columns[column]).max() <= MAX_ERROR
+
+
+def test_small_values_keep_their_decimals():
+    values = np.array([39.54, 0.31, 0.0, 1204.07])
+    blob = encode_columns({'value': values}, 'int32')
+    assert blob['columns'][0]['type'] == 'int32' and blob['columns'][0]['scale'] == 100
+    assert decode_columns(blob)['value'].tolist() == values.tolist()
+
+
+def test_large_values_widen_instead_of_rounding():
+    large = np.array([380_000_000.12, 39.54])
+    wide = np.array([INT32_MAX + 1, 0], dtype=np.int64)
+    blob = encode_columns({'large': large, 'wide': wide}, 'int32')
+    assert [entry['type'] for entry in blob['columns']] == ['int64', 'int64']
+    # 64-bit columns start on 8-byte boundaries for BigInt64Array
+    assert all(entry['offset'] % 8 == 0 for entry in blob['columns'])
+    decoded = decode_columns(blob)
+    assert decoded['large'].tolist() == large.tolist()
+    assert decoded['wide'].tolist() == wide.tolist()
+
+    blob = encode_columns({'large': large}, 'float32')
+    assert blob['columns'][0]['type'] == 'float64'
+    assert decode_columns(blob)['large'].tolist() == large.tolist()
+
+
+def test_integers_beyond_javascript_numbers_stay_json():
+    huge = np.array([2**60, 1], dtype=np.int64)
+    blob = encode_columns({'huge': huge}, 'int32')
+    assert blob['plain'] == {'huge': huge.tolist()}
+    assert decode_columns(blob)['huge'].tolist() == huge.tolist()
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'deflate'])
+def test_compression_covers_the_json_remainder(compression):
+    rest = {'strings': ['Chad', 'Niger'], 'offsets': [0, 1, 2]}
+    blob = encode_columns({'year': np.array([1990, 1991])}, 'int32', compression, rest)
+    assert set(blob) == {'compression', 'columns', 'json', 'data', 'plain'}
+    decoded = decode_columns(blob)
+    assert decoded['strings'] == rest['strings'] and decoded['offsets'] == rest['offsets']
+    assert decoded['year'].tolist() == [1990, 1991]
@@ -0,0 +1,68 @@
+import pytest
+
+import scales
+from data_loader import load_data
+from scales import compute_scales, decade_range, format_tick, load_scales, log_ticks
+
+ROWS = [
+    '2000.00,"Chad",0.00,0.50',
+    '2001.00,"Chad",250.00,2.00',
+    '2000.00,"Niger",12000.00,',
+    '2001.00,"Niger",3.00,40.00',
+]
+
+
+def write_source(path, rows=ROWS):
+    path.write_text('\n'.join(rows) + '\n', encoding='latin1')
+    return str(path)
+
+
+@pytest.fixture
+def computes(monkeypatch):
+    # Count the reductions behind load_scales()
+    calls = []
+    compute = scales.compute_scales
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return compute(*args, **kwargs)
+
+    monkeypatch.setattr(scales, 'compute_scales', counting)
+    return calls
+
+
+def test_ticks_cover_whole_decades():
+    assert decade_range(0.5, 12000.0) == [-1, 5]
+    assert decade_range(3.0, 3.0) == [0, 1]
+    assert log_ticks(0.1, 1e5) == ([0.1, 1.0, 10.0, 100.0, 1000.0, 10000.0, 100000.0],
+                                   ['0.1', '1', '10', '100', '1k', '10k', '100k'])
+    assert [format_tick(value) for value in (2.5e6, 3e9, 0.01)] == ['2.5M', '3B', '0.01']
+
+
+def test_scales_match_the_data(tmp_path):
+    data = load_data(write_source(tmp_path / 'source.txt'), str(tmp_path / 'cache'))
+    result = compute_scales(data, ['land cover', 'agricultural emissions'])
+
+    land = result['columns']['land cover']
+    assert (land['min'], land['max'], land['positive_min']) == (0.0, 12000.0, 3.0)
+    assert land['ticks'] == [1.0, 10.0, 100.0, 1000.0, 10000.0, 100000.0]
+    emissions = result['columns']['agricultural emissions']
+    # The loader fills the missing value with 0, which only the minimum sees
+    assert (emissions['min'], emissions['max'], emissions['positive_min']) == (0.0, 40.0, 0.5)
+    assert emissions['ticks'] == [0.1, 1.0, 10.0, 100.0]
+    # Per area, zeros are left out of the smallest positive value
+    assert result['area']['Chad'] == {'land cover': [250.0, 250.0], 'agricultural emissions': [0.5, 2.0]}
+    assert result['area']['Niger'] == {'land cover': [3.0, 12000.0], 'agricultural emissions': [40.0, 40.0]}
+
+
+def test_scales_are_computed_once_per_source(tmp_path, computes):
+    source = write_source(tmp_path / 'source.txt')
+    cache_dir = str(tmp_path / 'cache')
+    first = load_scales(file_name=source, cache_dir=cache_dir)
+    assert load_scales(file_name=source, cache_dir=cache_dir) == first
+    assert len(computes) == 1
+
+    write_source(tmp_path / 'source.txt', ROWS + ['2002.00,"Chad",90000.00,1.00'])
+    changed = load_scales(file_name=source, cache_dir=cache_dir)
+    assert len(computes) == 2
+    assert changed['columns']['land cover']['max'] == 90000.0
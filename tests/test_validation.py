@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import data_loader
+import enrichment
+
+from validation import load_report
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROWS = [
+    # "China" is the sum of its parts but not "Sudan", which is listed anyway
+    *[f'{year}.00,"China",{30 + year - 2000}.00,3.00' for year in range(2000, 2006)],
+    *[f'{year}.00,"China, mainland",{10 + year - 2000}.00,1.00' for year in range(2000, 2006)],
+    *[f'{year}.00,"China, Taiwan Province of",20.00,2.00' for year in range(2000, 2006)],
+    '2000.00,"Chad",5.00,',
+    '2000.00,"Chad",6.00,1.00',
+    '2001.00,"Chad",-1.00,1.00',
+    'n.d.,"Chad",1.00,1.00',
+    '2000.00,"Atlantis",1.00,1.00',
+    # One land cover value 0.7 decades above Niger's usual level
+    *[f'{year}.00,"Niger",{500 if year == 2005 else 100}.00,1.00' for year in range(2000, 2006)],
+]
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    # The real reference files, with a small source and its own cache
+    monkeypatch.chdir(REPO)
+    path = tmp_path / 'source.txt'
+    path.write_text('\n'.join(ROWS) + '\n', encoding='latin1')
+    return str(path), str(tmp_path / 'cache')
+
+
+def test_report_collects_every_check(source):
+    file_name, cache_dir = source
+    report = load_report(file_name, cache_dir=cache_dir)
+
+    assert report['rows'] == len(ROWS)
+    assert report['invalid_years'] == [[21, 'n.d.']]
+    assert report['missing']['agricultural emissions'] == [[2000, 'Chad']]
+    assert report['negative']['land cover'] == [[2001, 'Chad', -1.0]]
+    assert report['duplicates'] == [[2000, 'Chad', 2]]
+    assert report['aggregates'] == [{'area': 'China', 'parts': ['China, Taiwan Province of', 'China, mainland'],
+                                     'matches_parts': True, 'excluded': True}]
+    assert report['join_failures'] == {'continent': ['Atlantis'], 'population': ['Atlantis', 'China, Taiwan Province of']}
+    assert ['China, Taiwan Province of', 'China'] in report['fuzzy_joins']['continent']
+    assert report['fuzzy_joins']['population'] == []
+    assert report['summary']['unlisted_aggregates'] == 0
+    assert report['summary']['duplicates'] == 1 and report['summary']['population_failures'] == 2
+
+
+def test_report_is_served_from_the_snapshots(source, monkeypatch):
+    file_name, cache_dir = source
+    first = load_report(file_name, cache_dir=cache_dir)
+
+    # A second report neither parses the source nor joins the references
+    calls = []
+    monkeypatch.setattr(data_loader, 'parse_source', lambda *args, **kwargs: calls.append('parse'))
+    monkeypatch.setattr(enrichment, 'enrich', lambda *args, **kwargs: calls.append('enrich'))
+    assert load_report(file_name, cache_dir=cache_dir) == first
+    assert calls == []
+
+
+def test_outliers_are_looked_for_again_at_another_distance(source):
+    file_name, cache_dir = source
+    assert load_report(file_name, cache_dir=cache_dir)['outliers'] == []
+    near = load_report(file_name, decades=0.5, cache_dir=cache_dir)
+    assert near['outliers'] == [{'year': 2005, 'area': 'Niger', 'column': 'land cover', 'value': 500.0,
+                                 'area_median': 100.0}]
+    assert near['summary']['outliers'] == 1
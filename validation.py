@@ -0,0 +1,144 @@
+import argparse
+import json
+import sys
+from collections import Counter
+
+from aggregates import OUTLIER_DECADES, find_outliers
+from countries import AGGREGATES
+from data_loader import CACHE_DIR, SOURCE_FILE, load_data, snapshot_checks, snapshot_digest
+from enrichment import enriched_checks, load_enriched
+from instrumentation import stage
+
+# Data validation report for the source extract. Every check runs while a
+# snapshot is built, so the report costs no extra pass over the data:
+#   raw rows       missing and negative values, unparseable years and
+#                  repeated (year, area) keys (aggregates.RowChecks)
+#   cleaned rows   areas summing other areas ("China" = "China, mainland"
+#                  + ...) and values far from their area's usual level
+#                  (aggregates.AreaChecks)
+#   joins          areas a reference file does not resolve, and areas
+#                  resolved only by a name they contain (fuzzy joins), found
+#                  while enriching (countries.join_checks())
+# Graph1.py, Graph4.py and batch_jobs.py skip the aggregates (see
+# countries.skipped_areas()).
+REPORT_FILE = "validation_report.json"
+
+
+def find_aggregates(sums_of_parts, areas):
+    # Listed aggregates present in the data (excluded from continent
+    # figures, see countries.AGGREGATES) and the loader's sum-of-parts
+    # findings, flagged with whether the area is listed
+    found = {entry['area']: entry for entry in sums_of_parts}
+    for area in set(areas) & AGGREGATES:
+        found.setdefault(area, {'area': area, 'parts': [], 'matches_parts': False})
+    return [dict(found[area], excluded=area in AGGREGATES) for area in sorted(found)]
+
+
+def build_report(data, checks, joins, decades=OUTLIER_DECADES):
+    # The structured report: the findings recorded with the snapshots
+    # (checks, see data_loader.snapshot_checks(); joins, see
+    # enrichment.enriched_checks()), with a count per check under "summary".
+    # Outliers are only looked for again at a non-default distance.
+    with stage('validation'):
+        report = {
+            'rows': checks['rows'],
+            'areas': int(data['area'].nunique()),
+            'years': [int(data['year'].min()), int(data['year'].max())] if len(data) else [],
+            'invalid_years': checks['invalid_years'],
+            'missing': checks['missing'],
+            'negative': checks['negative'],
+            'duplicates': checks['duplicates'],
+            'aggregates': find_aggregates(checks['sums_of_parts'], data['area'].unique()),
+            'outliers': checks['outliers'] if decades == OUTLIER_DECADES else find_outliers(data, decades=decades),
+            'join_failures': joins['join_failures'],
+            'fuzzy_joins': joins['fuzzy_joins'],
+        }
+    report['summary'] = {
+        'invalid_years': len(report['invalid_years']),
+        'missing': sum(len(rows) for rows in report['missing'].values()),
+        'negative': sum(len(rows) for rows in report['negative'].values()),
+        'duplicates': len(report['duplicates']),
+        'aggregates': len(report['aggregates']),
+        'unlisted_aggregates': sum(1 for entry in report['aggregates']
+                                   if entry['matches_parts'] and not entry['excluded']),
+        'outliers': len(report['outliers']),
+        'continent_failures': len(report['join_failures']['continent']),
+        'population_failures': len(report['join_failures']['population']),
+        'fuzzy_joins': sum(len(pairs) for pairs in report['fuzzy_joins'].values()),
+    }
+    return report
+
+
+def load_report(file_name=SOURCE_FILE, decades=OUTLIER_DECADES, cache_dir=CACHE_DIR):
+    # Report for the current source, from its snapshots (parsed, enriched
+    # and checked only when the source or reference files have changed)
+    data = load_data(file_name, cache_dir)
+    load_enriched(file_name, cache_dir=cache_dir)
+    report = build_report(data, snapshot_checks(file_name, cache_dir), enriched_checks(file_name, cache_dir), decades)
+    return dict({'source': file_name, 'sha256': snapshot_digest(file_name, cache_dir)}, **report)
+
+
+def print_summary(report):
+    print(f"{report['source']}: {report['rows']} rows, {report['areas']} areas, "
+          f"years {'-'.join(str(year) for year in report['years'])}")
+    for column, rows in report['missing'].items():
+        if rows:
+            areas = Counter(area for year, area in rows).most_common(3)
+            print(f"Missing {column}: {len(rows)} rows (most in {', '.join(f'{a} ({n})' for a, n in areas)}); "
+                  "drawn as 0")
+    for column, rows in report['negative'].items():
+        if rows:
+            print(f"Negative {column}: {len(rows)} rows")
+    if report['invalid_years']:
+        print(f"Rows without a usable year (skipped): {len(report['invalid_years'])}")
+    if report['duplicates']:
+        print(f"Repeated (year, area) keys: {len(report['duplicates'])}")
+    for entry in report['aggregates']:
+        parts = f" = {' + '.join(entry['parts'])}" if entry['matches_parts'] else ''
+        if entry['excluded']:
+            status = 'excluded from continents and charts'
+        elif entry['matches_parts']:
+            status = 'no chart, but NOT excluded from continents; add it to countries.AGGREGATES'
+        else:
+            status = 'NOT excluded, add it to countries.AGGREGATES'
+        print(f"Aggregate: {entry['area']}{parts} ({status})")
+    if report['outliers']:
+        areas = Counter(row['area'] for row in report['outliers'])
+        years = Counter(row['year'] for row in report['outliers']).most_common(3)
+        print(f"Outliers: {len(report['outliers'])} values in {len(areas)} areas "
+              f"(most in {', '.join(f'{year} ({n})' for year, n in years)})")
+    for field, areas in report['join_failures'].items():
+        if areas:
+            print(f"No {field}: {', '.join(areas)}")
+    for field, pairs in report['fuzzy_joins'].items():
+        if pairs:
+            print(f"{field.capitalize()} by contained name (check): "
+                  f"{', '.join(f'{area} -> {name}' for area, name in pairs)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report missing values, repeated keys, aggregates, outliers "
+                                                 "and reference join failures in the source data.")
+    parser.add_argument('--output', default=REPORT_FILE, help=f"JSON report path (default: {REPORT_FILE})")
+    parser.add_argument('--outlier-decades', type=float, default=OUTLIER_DECADES,
+                        help=f"distance from the area's median, in decades, that makes a value an outlier "
+                             f"(default: {OUTLIER_DECADES:g})")
+    parser.add_argument('--strict', action='store_true',
+                        help="exit with status 1 on unusable years, repeated keys, negative values "
+                             "or aggregates that are not excluded")
+    args = parser.parse_args(argv)
+
+    report = load_report(decades=args.outlier_decades)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print_summary(report)
+    print(f"Report saved as {args.output}.")
+
+    summary = report['summary']
+    if args.strict and any(summary[check] for check in ('invalid_years', 'duplicates', 'negative',
+                                                        'unlisted_aggregates')):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import argparse
+import os
+import time
+import traceback
+
+from countries import CONTINENT_FILE
+from data_loader import SOURCE_FILE, file_digest, keep_in_memory
+from enrichment import POPULATION_FILE
+from graphs import COMMANDS, load_script
+
+# Keeps the generated outputs up to date while the inputs are edited: the
+# input files are polled, and after a change only the generators that read
+# the changed file are run again, in this process. The parsed source and
+# the enriched tables stay in memory between cycles (until their inputs
+# change), and the per-country generators still skip unchanged charts
+# through their build manifests.
+#
+# Generators are loaded once, so edits to the scripts themselves need a
+# restart.
+
+# command -> (input files it reads, options it is run with)
+WATCHED = {
+    'countries': ([SOURCE_FILE], ['--quiet']),
+    # The enriched table includes continents; the manifest skips every
+    # chart whose row did not change
+    'bars': ([SOURCE_FILE, CONTINENT_FILE, POPULATION_FILE], ['--quiet']),
+    'continent-chart': ([SOURCE_FILE, CONTINENT_FILE], ['--output', "continent_averages_2021.png"]),
+    'continents': ([SOURCE_FILE, CONTINENT_FILE], []),
+    'pie': ([SOURCE_FILE, CONTINENT_FILE], []),
+    'explorer': ([SOURCE_FILE], []),
+    'dashboard': ([SOURCE_FILE, CONTINENT_FILE, POPULATION_FILE], []),
+    'validate': ([SOURCE_FILE, CONTINENT_FILE, POPULATION_FILE], []),
+}
+
+
+def signatures(paths):
+    # {path: (size, mtime_ns)}, None for a file that is missing (e.g. while
+    # an editor replaces it)
+    result = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            result[path] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            result[path] = None
+    return result
+
+
+def wait_for_change(paths, previous, interval):
+    # Poll until some input changes and then stays unchanged for one more
+    # interval, so a file is not read half-written; return the new signatures
+    while True:
+        time.sleep(interval)
+        current = signatures(paths)
+        if current == previous:
+            continue
+        while True:
+            time.sleep(interval)
+            settled = signatures(paths)
+            if settled == current:
+                break
+            current = settled
+        if None not in current.values():
+            return current
+
+
+def affected(commands, changed):
+    # Commands reading any changed file, in COMMANDS order
+    return [command for command in COMMANDS if command in commands and set(WATCHED[command][0]) & changed]
+
+
+def rebuild(commands, modules):
+    for command in commands:
+        script = COMMANDS[command][0]
+        if command not in modules:
+            modules[command] = load_script(script)
+        print(f"--- {command} ({script})")
+        start = time.perf_counter()
+        try:
+            modules[command].main(WATCHED[command][1])
+        except Exception:
+            # Keep watching; the next edit may fix the input
+            traceback.print_exc()
+            print(f"--- {command} failed after {time.perf_counter() - start:.2f}s")
+        else:
+            print(f"--- {command} done in {time.perf_counter() - start:.2f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run the generators affected by each edit to the source or reference files.")
+    parser.add_argument('commands', nargs='*', metavar='command',
+                        help=f"generators to keep up to date (default: all of {', '.join(WATCHED)})")
+    parser.add_argument('--interval', type=float, default=1.0, help="seconds between polls (default: 1)")
+    parser.add_argument('--no-initial-build', action='store_true',
+                        help="only rebuild after the first change, not at startup")
+    args = parser.parse_args(argv)
+    unknown = [command for command in args.commands if command not in WATCHED]
+    if unknown:
+        parser.error(f"cannot watch {', '.join(unknown)}; choose from {', '.join(WATCHED)}")
+
+    commands = args.commands or list(WATCHED)
+    paths = sorted({path for command in commands for path in WATCHED[command][0]})
+    keep_in_memory()
+    modules = {}
+
+    # Content digests, so a save that leaves a file unchanged rebuilds
+    # nothing; taken before the initial build so edits made during it count
+    current = signatures(paths)
+    digests = {path: file_digest(path) for path in paths}
+
+    if not args.no_initial_build:
+        rebuild(affected(commands, set(paths)), modules)
+
+    print(f"Watching {', '.join(paths)} (Ctrl+C to stop)")
+    try:
+        while True:
+            current = wait_for_change(paths, current, args.interval)
+            changed = set()
+            for path in paths:
+                digest = file_digest(path)
+                if digest != digests[path]:
+                    digests[path] = digest
+                    changed.add(path)
+            if not changed:
+                continue
+            commands_to_run = affected(commands, changed)
+            print(f"Changed: {', '.join(sorted(changed))} -> rebuilding {', '.join(commands_to_run)}")
+            start = time.perf_counter()
+            rebuild(commands_to_run, modules)
+            print(f"Rebuilt {len(commands_to_run)} output(s) in {time.perf_counter() - start:.2f}s")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()